@@ -5,31 +5,54 @@ CODESYS LibDoc Scripting Collection V{version}
 
 Usage:
     libdoc -h | --help | --version
-    libdoc export [<library> [<content>]]
-    libdoc clean [<original-content> [<cleaned-content>]]
-    libdoc generate [-f] [-b] [-c] [-s | --slug=<maxch>] [<content> [<frame>]]  
+    libdoc export [-f] [<library> [<content>]]
+    libdoc clean [--stream] [<original-content> [<cleaned-content>]]
+    libdoc generate [-f] [-b] [-c] [-s | --slug=<maxch>] [--since=<old-content>] [<content> [<frame>]]
     libdoc merge [-d] [<content> [<frame> [<source>]]]
+    libdoc diff [--json=<file>] <old-content> <new-content>
     libdoc transform ({formats}) [[<struct>] [<language>]]
-    libdoc make [-n] [<input> [<output>]]
+    libdoc make [-n] [-f] [-k] [--explain] [<input> [<output>...]]
+    libdoc batch [-n] [-f] [--jobs=<n>] [--work=<dir>] [--timeout=<s>] [<libraries> [<format>...]]
     libdoc fresh [<frame>]
+    libdoc watch [--builder=<b>] [--interval=<s>] [<content> [<frame>]]
+    libdoc serve-daemon [--port=<n>]
 
 Options:
     -h --help       Show this screen.
     --version       Show version.
     -s              Slugify (ensure readable) names for file names. The length of the name stems is limited to 16.
     --slug=<maxch>  Specify maximal length for slugified file name stems. 
+    --since=<old-content>  Generate only the objects which differ from the <old-content>.
+    --json=<file>   Write the result of diff to a JSON file.
+    --stream        Clean the content particle by particle with bounded memory and write compact JSON.
+    --explain       Explain why each stage of make runs or is skipped.
+    --jobs=<n>      The number of libraries processed in parallel. Defaults to the number of CPUs.
+    --work=<dir>    The work folder of batch. Defaults to "Batch".
+    --timeout=<s>   The time limit in seconds for a single CODESYS export of batch.
+    --builder=<b>   The transformation of watch. Defaults to html.
+    --interval=<s>  The polling interval of watch in seconds. Defaults to 0.25.
+    --port=<n>      The local TCP port of serve-daemon. Defaults to 8377.
+    --trace=<file>  Record where any command spends its time and memory and write it to <file>.
+    --trace-format=<fmt>  The format of the trace file: json (default) or chrome (chrome://tracing, Perfetto).
+    --trace-memory  Record the peak Python memory of every part of the command, too (slower).
     <library>       The CODESYS library.
     <content>       JSON serialized content of a CODESYS library.
+    <old-content>   JSON serialized content of an older version of the library.
+    <new-content>   JSON serialized content of a newer version of the library.
     <frame>         Folder structure which mimics the structure of the library.
     <source>        The project folder for the sphinx-doc package.
     <struct>        One of the following structures: <frame> or <source>
     <language>      The code for the language in which the documentation will be localized.
     <input>         A file of one of the following types library, json
     <output>        A file or a folder of one of the following types chm, lmd, html
+    <libraries>     A folder with *.library files or a glob pattern like "libs/*.library"
+    <format>        One of the following output formats chm, lmd, html
 
 Commands:
     export          Using CODESYS and its DocExport functionality to serialize the <content> in a JSON file.
                     This command needs a CODESYS installation.
+                    The content of an unchanged library exported with the same CODESYS is taken from the export cache
+                    (environment variable LIBDOC_CACHE, default "~/.libdoc/cache"). The option '-f' bypasses the cache.
 
     clean           Analyses the <original-content> and generates a cleaned version named <cleaned-content>.
                     The default behaviour is defined as follows:
@@ -37,6 +60,7 @@ Commands:
                     * Elements with the modifiers ``INTERNAL`` and ``PRIVATE`` will be removed.
                     * All other Elements will not be removed.
                     This default behaviour can be adapted individually by providing a customized ``clean.conf`` file.
+                    The option '--stream' reads and writes the content particle by particle (for huge content files).
 
     generate        Parse the library <content> and generates/updates the <frame> folder structure which mimics
                     the structure of the library.
@@ -46,11 +70,20 @@ Commands:
                     The options '-s' and '--slug' generates slugified filenames inside the <frame>. 
                     The later allows to specify the maximal number of character of file name stem.
                     Both options work only together with '-c' option.
+                    The option '--since' generates only the frame and code files of the objects which differ
+                    from the <old-content> (see diff).
                     Note: The file 'conf.py' will never be overwritten.
 
     merge           Replaces the placeholders in the <frame> structure and  generates/updates
                     a sphinx-doc project structure <source>. (The option '-d' displays the merge cache for debugging)
 
+    diff            Compares the <old-content> with the <new-content>, e.g. two versions of a library.
+                    The data types, interfaces, global objects, POUs, methods, properties and variables are matched
+                    by their qualified names. The added (+), removed (-) and changed (~) elements are listed.
+                    The option '--json' writes the result (and the affected objects) to a JSON file.
+                    Example:
+                    libdoc diff lib-1.0.json lib-1.1.json
+
     transform       Using the sphinx-doc package to transform the <source> structure in a distributable
                     document in {format_text} format.
                     This command needs for generating a chm-file the installation of the Microsoft HTML-Workshop software.
@@ -58,8 +91,14 @@ Commands:
 {format_doc}
 
     make            Tries to generate the <output> from the defined <input>.
+                    Several <output> targets share the export, clean and generate stages.
                     The option '-n' generates normal paths inside the <frame>.
                     Generating condensed paths is the default.
+                    Every stage (export, clean, generate, transform) is skipped as long as its inputs
+                    are unchanged since its last successful run.
+                    The option '-f' forces all stages to run. The option '--explain' tells why a stage runs.
+                    The cleaned content is passed to generate in memory. The option '-k' keeps
+                    the cleaned content file <input>.clean.json for inspection.
                     Examples:
                     libdoc make lib.library lib.lmd -> Generates a lib.lmd file from lib.library
                     libdoc make lib.json lib.lmd -> Generates a lib.lmd file from lib.json
@@ -67,33 +106,112 @@ Commands:
                     libdoc make lib.json lib.chm -> Generates a lib.chm file from lib.json
                     libdoc make lib.library html -> Generates a lib-html folder from lib.library
                     libdoc make lib.json html -> Generates a lib-html folder from lib.json
+                    libdoc make lib.library html lib.chm lib.lmd -> Generates all three outputs from lib.library
                     libdoc make po-dir xlf-dir -> Convert the po files to XLIFF files
                     libdoc make xlf-dir po-dir -> Convert the XLIFF files to po files
                     libdoc make po-dir -> Convert the po files to mo files
 
+    batch           Runs make for every library in the folder or glob pattern <libraries> on a pool of processes.
+                    Each library is built in its own folder <work>/<name> with its own log file.
+                    The libraries are exported first by several CODESYS processes in parallel. An export is retried
+                    while the library is in use and killed after the '--timeout'.
+                    A failing library does not stop the others. A summary table is printed at the end.
+                    Examples:
+                    libdoc batch libs lmd -> Generates a <name>.lmd file for every library inside libs
+                    libdoc batch --jobs=4 "libs/SM3_*.library" lmd chm -> Four libraries in parallel, two formats
+
     fresh           Tries to generate a fresh frame documentation folder structure in the current working directory.
                     The parameter <frame> is optional and defaults to "Frame".
+
+    watch           Watches the <content>, the <frame>, the templates and conf.py and keeps the transformation
+                    up to date. A changed frame file is merged again, a changed content, conf.py or template
+                    merges all frame files. Only the changed source files are written, so sphinx-doc builds
+                    only the changed pages. Stop watching with Ctrl+C.
+                    Examples:
+                    libdoc watch -> Watches the content and the Frame folder of the working directory (html)
+                    libdoc watch --builder=chm lib.json -> Keeps the lib.chm up to date
+
+    serve-daemon    Runs libdoc as a local daemon for editor integrations. The daemon accepts libdoc command lines
+                    as JSON lines on 127.0.0.1:<n> and runs them in-process. Content files, templates and the Sphinx
+                    application stay loaded between the requests, so generate, merge and transform answer without
+                    the start-up costs. Every request carries the token of the file ~/.libdoc/serve-<n>.token,
+                    which only the user can read. See libdoc.serve for the protocol.
 """
+import importlib
 import multiprocessing
 import sys
 
 from docopt import docopt
 
 from libdoc import __version__ as version
+from libdoc import trace
 from libdoc.exceptions import LibDocError
 from libdoc.transformer import builders, builder_docs
-from libdoc.export import export
-from libdoc.generate import generate
-from libdoc.merge import merge
-from libdoc.transform import transform
-from libdoc.make import make
-from libdoc.clean import clean
-from libdoc.qstart import fresh
+
+#: The implementation of every command as "module:function".
+#: The modules are imported on demand, so only the chosen command pays for its dependencies.
+COMMANDS = {
+    'export': 'libdoc.export:export',
+    'clean': 'libdoc.clean:clean',
+    'generate': 'libdoc.generate:generate',
+    'diff': 'libdoc.diff:diff',
+    'merge': 'libdoc.merge:merge',
+    'transform': 'libdoc.transform:transform',
+    'make': 'libdoc.make:make',
+    'batch': 'libdoc.batch:batch',
+    'fresh': 'libdoc.qstart:fresh',
+    'watch': 'libdoc.watch:watch',
+    'serve-daemon': 'libdoc.serve:serve',
+}
+
+TRACE_OPTIONS = ('--trace', '--trace-format')  #: Options of every command, see :func:`split_trace_options`
+
+OPTIONS_WITH_VALUE = ('--slug', '--jobs', '--work', '--timeout', '--port', '--builder', '--interval',
+                      '--since', '--json')  #: Options whose value may follow as a separate argument
 
 
 def main(argv=None):
     if argv is None:
         argv = sys.argv[1:]
+    argv, options = split_trace_options(argv)
+    if options is None:
+        return run(argv)
+    trace.start(command=argv, **options)
+    try:
+        with trace.span(argv[0] if argv else 'libdoc'):
+            return run(argv)
+    finally:
+        print('Trace:', trace.stop())
+
+
+def split_trace_options(argv):
+    """
+    Remove the trace options, which are valid for every command, from the command line ``argv``.
+
+    :return: A tuple with the remaining arguments and the options of :func:`libdoc.trace.start`
+             (``None`` without ``--trace``).
+    """
+    remaining = []
+    values = {}
+    args = iter(argv)
+    for arg in args:
+        option, equal, value = arg.partition('=')
+        if option in TRACE_OPTIONS:
+            values[option] = value if equal else next(args, None)
+        elif arg == '--trace-memory':
+            values[arg] = True
+        else:
+            remaining.append(arg)
+    if not values.get('--trace'):
+        return remaining, None
+    return remaining, {'path': values['--trace'], 'fmt': values.get('--trace-format') or 'json',
+                       'memory': values.get('--trace-memory', False)}
+
+
+def run(argv):
+    """
+    Run the libdoc command line ``argv`` (without the trace options).
+    """
     code = 0
     kwargs = {}
     argv = [arg for arg in argv]
@@ -121,19 +239,58 @@ def main(argv=None):
                 kwargs['slug'] = int(arguments['--slug'])
         if arguments['-n']:
             kwargs['condensed'] = False
+        if arguments['--stream']:
+            kwargs['stream'] = True
+        if arguments['-k']:
+            kwargs['keep'] = True
+        if arguments['--explain']:
+            kwargs['explain'] = True
+        if arguments['--jobs'] and arguments['--jobs'].isnumeric():
+            kwargs['jobs'] = int(arguments['--jobs'])
+        if arguments['--timeout'] and arguments['--timeout'].isnumeric():
+            kwargs['timeout'] = int(arguments['--timeout'])
+        if arguments['--port'] and arguments['--port'].isnumeric():
+            kwargs['port'] = int(arguments['--port'])
+        if arguments['--builder']:
+            kwargs['builder'] = arguments['--builder']
+        if arguments['--interval']:
+            kwargs['interval'] = arguments['--interval']
+        if arguments['--since']:
+            kwargs['since'] = arguments['--since']
+        if arguments['--json']:
+            kwargs['output'] = arguments['--json']
+        if arguments['--work']:
+            kwargs['work'] = arguments['--work']
         command = argv[0]
-        argv = [arg for arg in argv[1:] if not arg.startswith('-')]
-        commands = globals()  #: The imported symbols like export, generate, transform, ... are members of globals()
-        if arguments[command] and command in commands:
-            command = commands[command]
+        positional = []
+        value = False
+        for arg in argv[1:]:
+            if value:
+                value = False  # the value of the previous option
+            elif arg.startswith('-'):
+                value = arg in OPTIONS_WITH_VALUE
+            else:
+                positional.append(arg)
+        argv = positional
+        if arguments[command] and command in COMMANDS:
+            command = load_command(command)
             print(doc.splitlines()[1])
             code = command(*argv, **kwargs)
     return code
 
+
+def load_command(name):
+    """
+    :return: The function which implements the command ``name``
+    """
+    module, function = COMMANDS[name].split(':')
+    return getattr(importlib.import_module(module), function)
+
+
 if __name__ == '__main__':
     multiprocessing.freeze_support()
     try:
         sys.exit(main())
     except LibDocError as ex:
-        print("{0}: {1}".format(type(ex).__name__, ex.message))
+        print("{0}: {1}".format(type(ex).__name__, ex))
         sys.exit(1)
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Archive
+~~~~~~~
+
+Deterministic, incremental and parallel zip packer for ``*.lmd`` archives.
+
+* Entries are compressed in parallel (``zlib`` releases the GIL while deflating).
+* Already compressed formats (see :data:`STORED_EXTENSIONS`) are stored without deflate.
+* The raw entries of the previous archive are reused for every file with an unchanged hash.
+  The hashes are kept in a small index file next to the archive.
+* Identical inputs produce byte-identical archives: the entries are sorted
+  and every entry carries the same timestamp and attributes.
+* Archives with more than 65535 entries or entries and offsets beyond 4 GiB get the ZIP64 records,
+  like :mod:`zipfile` writes them.
+"""
+import collections
+import hashlib
+import json
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from . import trace
+
+STORED_EXTENSIONS = frozenset(['.png', '.svg', '.woff', '.woff2', '.jpg', '.jpeg', '.gif', '.ico', '.gz', '.zip'])
+INDEX_SUFFIX = '.idx'  #: The suffix of the hash index file, stored next to the archive
+
+_STORED = 0
+_DEFLATED = 8
+_DOS_TIME = 0  #: 00:00:00
+_DOS_DATE = (1 << 5) | 1  #: 1980-01-01
+_VERSION = 20
+_VERSION_ZIP64 = 45
+_UTF8_FLAG = 0x800
+_DIR_ATTR = 0x10
+
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_ZIP64_END_RECORD = struct.Struct('<4sQ2H2L4Q')
+_ZIP64_LOCATOR = struct.Struct('<4sLQL')
+_ZIP64_EXTRA = 0x0001  #: The header id of the ZIP64 extended information extra field
+_LOCAL_SIGNATURE = b'PK\x03\x04'
+_CENTRAL_SIGNATURE = b'PK\x01\x02'
+_END_SIGNATURE = b'PK\x05\x06'
+_ZIP64_END_SIGNATURE = b'PK\x06\x06'
+_ZIP64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+_ZIP64_LIMIT = 0xFFFFFFFF  #: Sizes and offsets from this value on need ZIP64 records
+_ZIP64_COUNT_LIMIT = 0xFFFF  #: Entry counts from this value on need ZIP64 records
+_MAX_32 = 0xFFFFFFFF  #: The marker of a 32 bit value in the ZIP64 records
+_MAX_16 = 0xFFFF  #: The marker of a 16 bit value in the ZIP64 records
+
+
+def collect(source, skip_files=(), skip_dirs=()):
+    """
+    Collect the archive entries of the folder ``source`` in a stable order.
+
+    :return: A list of ``(arcname, path)`` tuples. ``path`` is ``None`` for directory entries.
+    """
+    entries = []
+    for root, dirs, files in os.walk(source):
+        dirs[:] = sorted(d for d in dirs if d not in skip_dirs)
+        rel_root = os.path.relpath(root, source).replace(os.sep, '/')
+        # add directory (needed for empty dirs)
+        entries.append((rel_root + '/', None))
+        for f in sorted(files):
+            if f in skip_files:
+                continue
+            file_name = os.path.join(root, f)
+            if os.path.isfile(file_name):  # regular files only
+                entries.append((f if rel_root == '.' else '/'.join([rel_root, f]), file_name))
+    return entries
+
+
+def _compress(index, entry):
+    """
+    :return: A tuple ``(sha1, method, crc, size, data)``.
+             ``data`` is ``None`` if the previous archive holds an entry with the same content.
+    """
+    arcname, path = entry
+    if path is None:
+        return None, _STORED, 0, 0, b''
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha1(data).hexdigest()
+    crc = zlib.crc32(data)
+    size = len(data)
+    method = _STORED if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS else _DEFLATED
+    old = index.get(arcname)
+    if old is not None and old['sha1'] == digest and old['method'] == method:
+        return digest, method, crc, size, None
+    if method == _DEFLATED:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        data = compressor.compress(data) + compressor.flush()
+    return digest, method, crc, size, data
+
+
+def _read_index(archive):
+    try:
+        with open(archive + INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _zip64_extra(*values):
+    return struct.pack('<2H{0}Q'.format(len(values)), _ZIP64_EXTRA, 8 * len(values), *values)
+
+
+def _marked(value):
+    return value if value < _ZIP64_LIMIT else _MAX_32
+
+
+def _local_header(name, flags, method, crc, compressed_size, size):
+    if compressed_size < _ZIP64_LIMIT and size < _ZIP64_LIMIT:
+        return _LOCAL_HEADER.pack(_LOCAL_SIGNATURE, _VERSION, flags, method, _DOS_TIME, _DOS_DATE,
+                                  crc, compressed_size, size, len(name), 0) + name
+    extra = _zip64_extra(size, compressed_size)
+    return _LOCAL_HEADER.pack(_LOCAL_SIGNATURE, _VERSION_ZIP64, flags, method, _DOS_TIME, _DOS_DATE,
+                              crc, _MAX_32, _MAX_32, len(name), len(extra)) + name + extra
+
+
+def _central_header(name, flags, method, crc, compressed_size, size, attributes, offset):
+    # the ZIP64 extra field holds the values which do not fit, in this order
+    values = [value for value in (size, compressed_size, offset) if value >= _ZIP64_LIMIT]
+    extra = _zip64_extra(*values) if values else b''
+    version = _VERSION_ZIP64 if values else _VERSION
+    return _CENTRAL_HEADER.pack(_CENTRAL_SIGNATURE, version, version, flags, method, _DOS_TIME, _DOS_DATE, crc,
+                                _marked(compressed_size), _marked(size), len(name),
+                                len(extra), 0, 0, 0, attributes, _marked(offset)) + name + extra
+
+
+def _end_records(count, central_size, central_offset, position):
+    """
+    :param position: The position of the end records, right behind the central directory.
+    :return: The end of central directory record and, if needed, the ZIP64 records in front of it.
+    """
+    records = b''
+    if count >= _ZIP64_COUNT_LIMIT or central_size >= _ZIP64_LIMIT or central_offset >= _ZIP64_LIMIT:
+        records = _ZIP64_END_RECORD.pack(_ZIP64_END_SIGNATURE, _ZIP64_END_RECORD.size - 12,
+                                         _VERSION_ZIP64, _VERSION_ZIP64, 0, 0, count, count,
+                                         central_size, central_offset)
+        records += _ZIP64_LOCATOR.pack(_ZIP64_LOCATOR_SIGNATURE, 0, position, 1)
+    count = count if count < _ZIP64_COUNT_LIMIT else _MAX_16
+    return records + _END_RECORD.pack(_END_SIGNATURE, 0, 0, count, count, _marked(central_size),
+                                      _marked(central_offset), 0)
+
+
+def _compressed(executor, index, entries, window):
+    """
+    Compress the ``entries`` in parallel and yield their results in order.
+    At most ``window`` entries are in flight, so the memory does not grow with the size of the archive.
+    """
+    pending = collections.deque()
+    for entry in entries:
+        pending.append(executor.submit(_compress, index, entry))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _read_raw(f, offset, compressed_size, name, crc, method):
+    """
+    Read the raw data of an entry of the previous archive.
+    The local header has to match the entry of the index, otherwise the index is stale.
+
+    :return: The raw data or ``None`` if the entry does not match.
+    """
+    f.seek(offset)
+    header = f.read(_LOCAL_HEADER.size)
+    if len(header) != _LOCAL_HEADER.size or header[:4] != _LOCAL_SIGNATURE:
+        return None
+    fields = _LOCAL_HEADER.unpack(header)
+    if fields[3] != method or fields[6] != crc or fields[7] not in (compressed_size, _MAX_32):
+        return None
+    if fields[9] != len(name) or f.read(fields[9]) != name:
+        return None
+    f.seek(fields[10], os.SEEK_CUR)
+    data = f.read(compressed_size)
+    return data if len(data) == compressed_size else None
+
+
+@trace.traced('archive')
+def pack(source, archive, skip_files=(), skip_dirs=(), jobs=None):
+    """
+    Put all files of the folder ``source`` into the zip file ``archive``.
+
+    :param source: The folder to pack.
+    :param archive: The path of the zip file. An existing archive is used as cache and replaced atomically.
+    :param skip_files: File names which should not be part of the archive.
+    :param skip_dirs: Folder names which should not be part of the archive.
+    :param jobs: Optional. The number of parallel compression jobs. Defaults to the number of CPUs.
+    :return: A tuple with the number of written and the number of reused entries.
+    """
+    tmp_archive = archive + '.tmp'
+    tmp_index = archive + INDEX_SUFFIX + '.tmp'
+    for tmp in (tmp_archive, tmp_index):  # left behind by a killed run
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+    skip_files = set(skip_files) | {os.path.basename(f) for f in (archive, archive + INDEX_SUFFIX,
+                                                                   tmp_archive, tmp_index)}
+    entries = collect(source, skip_files, skip_dirs)
+    index = _read_index(archive) if os.path.isfile(archive) else {}
+    old_file = open(archive, 'rb') if index else None
+    new_index = {}
+    central = []
+    offset = reused = 0
+    jobs = jobs or os.cpu_count() or 1
+    try:
+        with open(tmp_archive, 'wb') as f, ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = _compressed(executor, index, entries, 2 * jobs)
+            for (arcname, path), (digest, method, crc, size, data) in zip(entries, results):
+                name = arcname.encode('utf-8')
+                if data is None:
+                    old = index[arcname]
+                    data = _read_raw(old_file, old['offset'], old['csize'], name, crc, method)
+                    if data is None:
+                        digest, method, crc, size, data = _compress({}, (arcname, path))
+                    else:
+                        reused += 1
+                flags = 0 if arcname.isascii() else _UTF8_FLAG
+                f.write(_local_header(name, flags, method, crc, len(data), size))
+                f.write(data)
+                central.append(_central_header(name, flags, method, crc, len(data), size,
+                                               _DIR_ATTR if path is None else 0, offset))
+                if digest is not None:
+                    new_index[arcname] = {'sha1': digest, 'method': method, 'offset': offset, 'csize': len(data)}
+                offset = f.tell()
+            for record in central:
+                f.write(record)
+            f.write(_end_records(len(central), f.tell() - offset, offset, f.tell()))
+        with open(tmp_index, 'w', encoding='utf-8') as f:
+            json.dump(new_index, f, sort_keys=True, separators=(',', ':'))
+    except BaseException:
+        for tmp in (tmp_archive, tmp_index):
+            if os.path.isfile(tmp):
+                os.remove(tmp)
+        raise
+    finally:
+        if old_file is not None:
+            old_file.close()
+    # the index is replaced first: a crash in between leaves a new index next to the old archive,
+    # whose entries are rejected by the local header checks of the next run
+    os.replace(tmp_index, archive + INDEX_SUFFIX)
+    os.replace(tmp_archive, archive)
+    trace.count('entries', len(entries))
+    trace.count('bytes', os.path.getsize(archive))
+    return len(entries), reused
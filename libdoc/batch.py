@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Batch
+~~~~~
+
+Run the ``libdoc make`` pipeline for many libraries on a bounded process pool.
+
+Every library gets its own work folder ``<work>/<name>`` with a copy of the library,
+the ``clean.conf`` of its source folder (if any), the build results and the log file :data:`~libdoc.core.BATCH_LOG`.
+The libraries are exported first with concurrent CODESYS processes (see :func:`~libdoc.export.export_all`),
+afterwards the exported contents are made on the process pool.
+The libraries are independent: a failing library is reported in the summary, all other libraries still run.
+"""
+import contextlib
+import fnmatch
+import glob
+import os
+import shutil
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import core
+from .make import make, INPUT_EXT, OUTPUT_EXT
+from .export import export_all
+from .stage import file_digest
+from .exceptions import MakeError
+
+
+def _libraries(pattern):
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, core.EXT_LIBRARY)
+    files = [f for f in glob.glob(pattern)
+             if os.path.isfile(f) and os.path.splitext(f)[1][1:] in INPUT_EXT
+             and not fnmatch.fnmatch(f, core.EXT_CLEAN_JSON) and not fnmatch.fnmatch(f, core.EXT_SYMBOLS_JSON)]
+    return sorted(os.path.abspath(f) for f in files)
+
+
+def _stage_input(library, folder):
+    """
+    Copy ``library`` and the ``clean.conf`` next to it into the work ``folder``.
+    Unchanged files are not copied again, so the stages of the previous run stay valid.
+
+    :return: The path of the library copy.
+    """
+    copies = [library, os.path.join(os.path.dirname(library), 'clean.conf')]
+    for src in copies:
+        dst = os.path.join(folder, os.path.basename(src))
+        if os.path.isfile(src) and file_digest(src) != file_digest(dst):
+            shutil.copy2(src, dst)
+    return os.path.join(folder, os.path.basename(library))
+
+
+def _make_library(library, inp, formats, condensed=True, force=False):
+    """
+    Run ``libdoc make`` for a single library inside its work folder.
+    The output of the pipeline is written to the log file of the library.
+
+    :param library: The original library.
+    :param inp: The input of make inside the work folder (the library copy or its exported content).
+    :return: A tuple ``(library, code, elapsed, log, error)``
+    """
+    name = os.path.splitext(os.path.basename(library))[0]
+    folder = os.path.dirname(inp)
+    log = os.path.join(folder, core.BATCH_LOG)
+    outputs = [fmt if fmt == 'html' else '{0}.{1}'.format(name, fmt) for fmt in formats]
+    code, error = 1, None
+    old_dir = os.getcwd()
+    start = time.time()
+    with open(log, 'w', encoding='utf-8') as f, contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
+        try:
+            os.chdir(folder)
+            code = make(inp, *outputs, condensed=condensed, force=force)
+        except Exception as ex:  # a broken library must not stop the batch
+            traceback.print_exc()
+            error = '{0}: {1}'.format(type(ex).__name__, ex)
+        finally:
+            os.chdir(old_dir)
+    return library, code, time.time() - start, log, error
+
+
+def batch(libraries=None, *formats, work=None, jobs=None, timeout=None, condensed=True, force=False):
+    """
+    Generate the <formats> of all libraries selected by <libraries>.
+
+    :param libraries: Optional. A folder (all ``*.library`` files inside) or a glob pattern.
+                      Defaults to the current working directory.
+    :param formats: Optional. The output formats (chm, lmd, html). Defaults to chm.
+    :param work: Optional. The work folder. Defaults to ``./Batch``.
+    :param jobs: Optional. The number of libraries processed in parallel. Defaults to the number of CPUs.
+    :param timeout: Optional. The time limit of a single export in seconds.
+    :param condensed: Optional. Generate condensed paths inside the frames.
+    :param force: Optional. Run all stages regardless of their previous runs.
+    :return: 0 if all libraries were generated successfully, otherwise 1
+    """
+    files = _libraries(libraries or '.')
+    if not files:
+        raise MakeError('Not able to find any library in {0}'.format(libraries or '.'))
+    names = [os.path.splitext(os.path.basename(f))[0] for f in files]
+    duplicates = sorted(set(n for n in names if names.count(n) > 1))
+    if duplicates:
+        raise MakeError('The library names are not unique: {0}'.format(', '.join(duplicates)))
+
+    formats = [os.path.splitext(fmt)[1][1:] or fmt for fmt in formats] or ['chm']
+    for fmt in formats:
+        if fmt not in OUTPUT_EXT or fmt == 'json':
+            raise MakeError('Not able to handle file format: *.{ext}'.format(ext=fmt))
+    work = os.path.abspath(work or core.BATCH)
+    os.makedirs(work, exist_ok=True)
+    jobs = int(jobs) if jobs else None
+
+    print('Batch:', len(files), 'libraries ->', ', '.join(formats), 'in', work)
+    start = time.time()
+    results = {}
+    inputs = {}
+    for library, name in zip(files, names):
+        folder = os.path.join(work, name)
+        os.makedirs(folder, exist_ok=True)
+        inputs[library] = _stage_input(library, folder)
+
+    # the make pipelines start with the exported contents
+    export_times = {}
+    exports = [library for library in files if fnmatch.fnmatch(library, core.EXT_LIBRARY)]
+    if exports:
+        for library, result in zip(exports, export_all([inputs[library] for library in exports], jobs=jobs,
+                                                       timeout=timeout, force=force)):
+            if result.code == 0:
+                inputs[library] = result.content
+                export_times[library] = result.elapsed
+            else:
+                results[library] = (library, result.code, result.elapsed, result.log, result.message)
+                print('Failed:', os.path.basename(library), '(export)')
+
+    def done(result):
+        library, code, elapsed, log, error = result
+        results[library] = (library, code, elapsed + export_times.get(library, 0.0), log, error)
+        print('{0} {1} ({2:.1f} s)'.format('Done:' if code == 0 else 'Failed:', os.path.basename(library), elapsed))
+
+    pending = [library for library in files if library not in results]
+    if jobs == 1 or len(pending) == 1:
+        for library in pending:
+            done(_make_library(library, inputs[library], formats, condensed, force))
+    elif pending:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(_make_library, library, inputs[library], formats, condensed, force): library
+                       for library in pending}
+            for future in as_completed(futures):
+                library = futures[future]
+                try:
+                    done(future.result())
+                except Exception as ex:  # e.g. a crashed worker process
+                    name = os.path.splitext(os.path.basename(library))[0]
+                    done((library, 1, 0.0, os.path.join(work, name, core.BATCH_LOG),
+                          '{0}: {1}'.format(type(ex).__name__, ex)))
+
+    width = max(len(name) for name in names + ['Library'])
+    print('Summary:')
+    print('    {0:<{w}}  {1:<6}  {2:>8}  {3}'.format('Library', 'Result', 'Time', 'Log', w=width))
+    failed = 0
+    for library, name in zip(files, names):
+        _, code, elapsed, log, error = results[library]
+        failed += code != 0
+        print('    {0:<{w}}  {1:<6}  {2:>6.1f} s  {3}'.format(name, code, elapsed, log, w=width))
+        if error:
+            print('    {0:<{w}}  {1}'.format('', error, w=width))
+    print('{0} of {1} libraries failed ({2:.1f} s)'.format(failed, len(files), time.time() - start))
+    return 1 if failed else 0
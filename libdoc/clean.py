@@ -6,14 +6,180 @@ Clean
 The clean module provides functionality for removing some specified parts of a JSON file.
 """
 
-from collections.abc import Sequence  # Changed from collections to collections.abc
 import os
 import fnmatch
 import json
 
-from . import core
+from . import core, trace
 from .exceptions import ContentError
 
+
+def _attribute_name(spec):
+    return spec if isinstance(spec, str) else spec[0]
+
+
+def _compile_attributes(specs, truncate=False):
+    """
+    Compile attribute specifications like ``[["hide", "*"], ["myattribute", "myvalue"], "myattribute2"]``.
+
+    :param specs: The attribute specifications of the configuration.
+                  A plain string or a missing value selects the attribute with an arbitrary or no value.
+    :param truncate: Optional. Stop at the first empty specification (``filter`` semantic),
+                     otherwise empty specifications are ignored.
+    :return: A dict mapping the attribute names to ``None`` (arbitrary value) or to the set of selected values
+    """
+    rules = {}
+    for spec in specs or ():
+        if not spec:
+            if truncate:
+                break
+            continue
+        name = _attribute_name(spec)
+        value = None if isinstance(spec, str) or len(spec) < 2 else spec[1]
+        if value is None or value == '*':
+            rules[name] = None
+        elif rules.get(name, ()) is not None:
+            rules.setdefault(name, set()).add(value)
+    return rules
+
+
+def _matching(rules, attributes):
+    """
+    :return: The names of the ``attributes`` selected by the compiled ``rules``
+    """
+    return [name for name, attribute in attributes.items() if name in rules and (
+        rules[name] is None or (attribute.get("Value") if attribute else None) in rules[name])]
+
+
+def _matches_any(rules, attributes):
+    for name, attribute in attributes.items():
+        if name in rules:
+            values = rules[name]
+            if values is None or (attribute.get("Value") if attribute else None) in values:
+                return True
+    return False
+
+
+class JSONStream(object):
+    """
+    Read the values of a large JSON document one by one without loading the whole document.
+
+    The text is read in chunks. A value which does not fit into the buffer grows the buffer geometrically,
+    so every part of the document is decoded only a constant number of times.
+
+    :param f: A text file object.
+    :param chunk_size: Optional. The initial size of the chunks to read.
+    """
+
+    def __init__(self, f, chunk_size=64 * 1024):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _read(self):
+        # at least double the pending part of the buffer
+        data = '' if self._eof else self._f.read(max(self._chunk_size, len(self._buffer) - self._pos))
+        if not data:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """
+        :return: The next non whitespace character or an empty string at the end of the document
+        """
+        while True:
+            self._pos = core.JSON_WHITESPACE_REGEX.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                return ''
+
+    def expect(self, chars):
+        """
+        Consume the next character, which has to be one of ``chars``.
+
+        :return: The consumed character
+        """
+        char = self.peek()
+        if not char or char not in chars:
+            raise ContentError('Invalid JSON: expected one of {0!r} at {1!r}'.format(
+                chars, self._buffer[self._pos:self._pos + 20]))
+        self._pos += 1
+        return char
+
+    def value(self):
+        """
+        :return: The next complete JSON value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # a number could be continued by the next chunk (e.g. "-0." + "5"), unless a delimiter follows
+                if self._eof or not isinstance(value, (int, float)) or isinstance(value, bool) or (
+                        end < len(self._buffer) and self._buffer[end] in core.JSON_NUMBER_END):
+                    self._pos = end
+                    return value
+            except ValueError:
+                if self._eof:
+                    raise ContentError('Invalid JSON: incomplete value at the end of the document')
+            self._read()
+
+    def keys(self):
+        """
+        Iterate over the keys of the next JSON object.
+        The caller has to consume the value of each key before the iteration continues.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+
+class PathTrie(object):
+    """
+    A set of paths stored as a trie of their segments, e.g. ``("POUs", "FB_Axis", "Methods", "Reset")``.
+    A path is covered by the trie if the path itself or one of its ancestors was added.
+    """
+
+    def __init__(self):
+        self._root = {}
+
+    def add(self, segments):
+        node = self._root
+        for segment in segments:
+            if None in node:
+                return  # an ancestor is already part of the trie
+            node = node.setdefault(segment, {})
+        node.clear()
+        node[None] = None  # end of a path, the subtree is covered
+
+    def covers(self, segments):
+        node = self._root
+        for segment in segments:
+            if None in node:
+                return True
+            node = node.get(segment)
+            if node is None:
+                return False
+        return None in node
+
+    def __bool__(self):
+        return bool(self._root)
+
+
 class Cleaner(object):
     """
     Evaluate a configuration and remove the specified parts.
@@ -60,138 +226,108 @@ class Cleaner(object):
                 }
             }
 
-        self._all = set()
-        self._include = set()
-        self._exclude = set()
-
-        check_attribute_include = "include" in self._conf and "attribute" in self._conf["include"]
-        check_attribute_exclude = "exclude" in self._conf and "attribute" in self._conf["exclude"]
-        check_attribute_filter = "filter" in self._conf and "attribute" in self._conf["filter"]
-        check_attribute_preserve = "preserve" in self._conf and "attribute" in self._conf["preserve"]
-        self._include_attributes = self._conf["include"]["attribute"] if check_attribute_include else []
-        self._exclude_attributes = self._conf["exclude"]["attribute"] if check_attribute_exclude else []
-        self._filter_attributes = self._conf["filter"]["attribute"] if check_attribute_filter else []
-        self._preserve_attributes = self._conf["preserve"]["attribute"] if check_attribute_preserve else []
+        self._exclude = PathTrie()
 
-        check_keyword_include = "include" in self._conf and "keyword" in self._conf["include"]
-        check_keyword_exclude = "exclude" in self._conf and "keyword" in self._conf["exclude"]
-        self._include_keywords = self._conf["include"]["keyword"] if check_keyword_include else []
-        self._exclude_keywords = self._conf["exclude"]["keyword"] if check_keyword_exclude else []
+        # compile the configuration once into lookup tables
+        include = self._conf.get("include") or {}
+        exclude = self._conf.get("exclude") or {}
+        self._include_attributes = _compile_attributes(include.get("attribute"))
+        self._exclude_attributes = _compile_attributes(exclude.get("attribute"))
+        self._filter_attributes = _compile_attributes((self._conf.get("filter") or {}).get("attribute"), truncate=True)
+        self._filter_all = '*' in self._filter_attributes
+        self._preserve_attributes = frozenset(_attribute_name(spec) for spec in
+                                              (self._conf.get("preserve") or {}).get("attribute") or () if spec)
+        self._include_keywords = frozenset(include.get("keyword") or ())
+        self._exclude_keywords = frozenset(exclude.get("keyword") or ())
 
         self._areas = areas or ["DataTypes", "Interfaces", "GlobalObjects", "POUs"]
         self._sub_areas = ["Methods", "Properties", "Actions", "Transitions"]
 
-    def _check_attributes(self, path, particle):
-        if "Attributes" in particle:
-            for collection, attributes in [(self._include, self._include_attributes),
-                                           (self._exclude, self._exclude_attributes)]:
-                # process the attribute action
-                for attribute_def in attributes:
-                    if not attribute_def:
-                        continue
-                    if isinstance(attribute_def, Sequence):
-                        name = attribute_def[0]
-                        value = attribute_def[1] if len(attribute_def) > 1 else None
-                    else:
-                        name = attribute_def
-                        value = None
-                    if name == '*':
-                        # exclude whole particle
-                        self._exclude.add(".".join([path, particle["Name"]]))
-                        break
-                    if name in particle["Attributes"]:
-                        attribute = particle["Attributes"][name]
-                        if value is None or value == '*' or value == attribute.get("Value"):
-                            collection.add(".".join([path, particle["Name"]]))
-
-            # process attributes appearing (whether it appears at all)
-            for filter_attribute in self._filter_attributes:
-                if not filter_attribute:
-                    # no attribute to remove
-                    break
-                name = filter_attribute[0]
-                value = filter_attribute[1] if len(filter_attribute) > 1 else None
-                if name == '*':
-                    # remove all attributes, but respect objections
-                    if self._preserve_attributes:
-                        for attr_name in particle["Attributes"]:
-                            if not any(attr_name == x[0] for x in self._preserve_attributes if x):
-                                self._exclude.add(".".join([path, particle["Name"], "Attributes", attr_name]))
-                    else:
-                        self._exclude.add(".".join([path, particle["Name"], "Attributes"]))
-                        break
-                if name in particle["Attributes"]:
-                    # remove specified attribute
-                    attribute = particle["Attributes"][name]
-                    if value is None or value == '*' or value == attribute.get("Value"):
-                        self._exclude.add(".".join([path, particle["Name"], "Attributes", name]))
+    def _is_excluded(self, element):
+        include = exclude = False
+        if "Attributes" in element:
+            attributes = element["Attributes"]
+            # '*' selects every element with attributes
+            include = '*' in self._include_attributes or _matches_any(self._include_attributes, attributes)
+            exclude = '*' in self._exclude_attributes or _matches_any(self._exclude_attributes, attributes)
+        if "AccessModifiers" in element:
+            modifiers = set(modifier.upper() for modifier in element["AccessModifiers"])
+            include = include or not self._include_keywords.isdisjoint(modifiers)
+            exclude = exclude or not self._exclude_keywords.isdisjoint(modifiers)
+        return exclude and not include
 
-    def _check_members(self, members_list):
-        candidates = []
-        for member in members_list:
-            member_is_candidate = False
-            if "Attributes" in member:
-                attributes = member["Attributes"]
-                for attribute in attributes:
-                    value = attributes[attribute]
-                    value = value.get("Value") if value else None
-                    for exclude_attribute in self._exclude_attributes:
-                        if isinstance(exclude_attribute, Sequence):
-                            excl_attr_name = exclude_attribute[0]
-                            excl_attr_value = exclude_attribute[1] if len(exclude_attribute) > 1 else None
-                        else:
-                            excl_attr_name = exclude_attribute
-                            excl_attr_value = None
-                        if attribute == excl_attr_name:
-                            if excl_attr_value is None or excl_attr_value == '*' or excl_attr_value == value:
-                                candidates.append(member)
-                                member_is_candidate = True
-                                break
-                    if member_is_candidate:
-                        break
-
-        for c in candidates:
-            members_list.remove(c)
+    def _filter_element_attributes(self, element):
+        if "Attributes" in element:
+            if self._filter_all and not self._preserve_attributes:
+                # remove all attributes
+                del element["Attributes"]
+                return
+            attributes = element["Attributes"]
+            names = set(_matching(self._filter_attributes, attributes))
+            if self._filter_all:
+                # remove all attributes, but respect objections
+                names.update(name for name in attributes if name not in self._preserve_attributes)
+            for name in names:
+                del attributes[name]
 
+    def _check_members(self, members_list):
+        # one pass: drop the excluded members and filter the attributes of the remaining ones
+        kept = []
         for member in members_list:
             if "Attributes" in member:
                 attrs = member["Attributes"]
-                for filter_attribute in self._filter_attributes:
-                    if not filter_attribute:
-                        # no attribute to remove
-                        break
-                    name = filter_attribute[0]
-                    value = filter_attribute[1] if len(filter_attribute) > 1 else None
-                    if name == '*':
-                        # remove all attributes
-                        del member["Attributes"]
-                        break
-                    if name in attrs:
+                if _matches_any(self._exclude_attributes, attrs):
+                    continue
+                if self._filter_all:
+                    # remove all attributes
+                    del member["Attributes"]
+                elif self._filter_attributes:
+                    for name in _matching(self._filter_attributes, attrs):
                         # remove specified attribute
-                        attribute = attrs[name]
-                        if value is None or value == '*' or value == attribute.get("Value"):
-                            del attrs[name]
-
-    def _check_keywords(self, path, particle):
-        if "AccessModifiers" in particle:
-            for collection, keywords in [(self._include, self._include_keywords),
-                                         (self._exclude, self._exclude_keywords)]:
-                modifiers = particle["AccessModifiers"]
-                for modifier in modifiers:
-                    if modifier.upper() in keywords:
-                        collection.add(".".join([path, particle["Name"]]))
-
-    def _check_all(self, path, element):
-        if "Attributes" in element:
-            self._check_attributes(path, element)
-        if "AccessModifiers" in element:
-            self._check_keywords(path, element)
+                        del attrs[name]
+            kept.append(member)
+        members_list[:] = kept
+
+    def _clean_element(self, path, element):
+        """
+        Check the element, remove its filtered attributes and its excluded members.
+
+        :param path: The path segments of the element.
+        :return: False if the whole element is excluded. The path is then recorded in the exclusion trie.
+        """
+        if self._is_excluded(element):
+            self._exclude.add(path)
+            return False
+        self._filter_element_attributes(element)
         if "Variables" in element:
-            members_list = element["Variables"]
-            self._check_members(members_list)
+            self._check_members(element["Variables"])
         if "Members" in element:
-            members_list = element["Members"]
-            self._check_members(members_list)
+            self._check_members(element["Members"])
+        return True
+
+    def _clean_particle(self, area, particle):
+        """
+        Clean a top level particle (data type, interface, global object or POU) and its children in place.
+        The children of an excluded particle are not visited at all.
+
+        :return: False if the whole particle is excluded
+        """
+        path = (area, particle["Name"])
+        if not self._clean_element(path, particle):
+            return False
+        for sub in self._sub_areas:
+            if sub in particle:
+                children = particle[sub]
+                for key, child in list(children.items()):
+                    child_path = path + (sub, child["Name"])
+                    if not self._clean_element(child_path, child):
+                        del children[key]
+                    elif sub == "Properties" and "Accessors" in child:
+                        accessors = child["Accessors"]
+                        for acc_key, acc in list(accessors.items()):
+                            if not self._clean_element(child_path + ("Accessors", acc["Name"]), acc):
+                                del accessors[acc_key]
+        return True
 
     def _clean_structure(self, structure):
         for struct in structure:
@@ -202,7 +338,7 @@ class Cleaner(object):
                     del struct["Content"]
             if "Object" in struct:
                 path = struct["Object"]
-                if path in self._exclude:
+                if self._exclude.covers(path.split('.')):
                     if "Content" in struct:
                         del struct["Content"]
                     del struct["Object"]
@@ -212,6 +348,50 @@ class Cleaner(object):
                 del struct["Doc"]
         structure[:] = [s for s in structure if s]
 
+    def clean_stream(self, content_file_path, clean_content_file_path):
+        """
+        | Read the JSON file particle by particle.
+        | Evaluate the current configuration on every particle.
+        | Write the kept particles in compact form to the cleaned JSON file.
+
+        Only a single particle is held in memory at a time, the ``ProjectStructure`` is written last.
+
+        :param content_file_path: path to the JSON file containing the data structure
+        :param clean_content_file_path: path of the cleaned JSON file
+        :return: None
+        """
+        def encode(value):
+            return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+        structure = None
+        with open(content_file_path, 'r', encoding='utf-8') as src, \
+                open(clean_content_file_path, 'w', encoding='utf-8') as dst:
+            stream = JSONStream(src)
+            separator = '{'
+            for key in stream.keys():
+                if key == "ProjectStructure":
+                    structure = stream.value()
+                    continue
+                dst.write(separator + encode(key) + ':')
+                separator = ','
+                if key not in self._areas:
+                    dst.write(encode(stream.value()))
+                    continue
+                particle_separator = '{'
+                for name in stream.keys():
+                    particle = stream.value()
+                    if self._clean_particle(key, particle):
+                        dst.write(particle_separator + encode(name) + ':' + encode(particle))
+                        particle_separator = ','
+                dst.write('}' if particle_separator == ',' else '{}')
+            if structure is not None:
+                content = structure.get("Content")
+                if content:
+                    self._clean_structure(content)
+                dst.write(separator + encode("ProjectStructure") + ':' + encode(structure))
+                separator = ','
+            dst.write('}' if separator == ',' else '{}')
+
     def dump_conf(self, conf_file_path):
         """
         Generate a JSON file with the current configuration.
@@ -234,48 +414,48 @@ class Cleaner(object):
         with open(content_file_path, 'r', encoding='utf-8') as f:
             self._content = json.load(f)
 
+        # a single walk: the excluded particles are removed on the way, their paths are kept in a trie
         for area in self._areas:
             particles = self._content[area]
-            for particle in particles.values():
-                self._all.add(".".join([area, particle["Name"]]))
-                for sub in self._sub_areas:
-                    if sub in particle:
-                        path = ".".join([area, particle["Name"], sub])
+            for key, particle in list(particles.items()):
+                if not self._clean_particle(area, particle):
+                    del particles[key]
 
-                        for child in particle[sub].values():
-                            self._all.add('.'.join([path, child["Name"]]))
+        structure = self._content["ProjectStructure"].get("Content")
+        if structure:
+            self._clean_structure(structure)
+        return self._content
 
-                            if sub == "Properties":
-                                if "Accessors" in child:
-                                    for accessor in child["Accessors"]:
-                                        acc = child["Accessors"][accessor]
-                                        acc_path = ".".join([path, child["Name"], "Accessors"])
-                                        self._all.add(".".join([acc_path, acc["Name"]]))
 
-                                        self._check_all(acc_path, acc)
+def _cleaner(content):
+    conf_file = os.path.join(os.path.dirname(content), 'clean.conf')
+    cleaner = Cleaner(conf_file_path=conf_file)
+    if not os.path.isfile(conf_file):
+        cleaner.dump_conf(conf_file)
+    return cleaner
 
-                            self._check_all(path, child)
 
-                self._check_all(area, particle)
+def clean_data(content):
+    """
+    Remove (clean) the parts specified by the ``clean.conf`` next to the original content.
+    If the ``clean.conf`` does not exist, the default configuration is written.
 
-        self._exclude = self._exclude - self._include
+    :param content: The path to the original JSON file.
+    :return: The cleaned data structure
+    """
+    return _cleaner(content).clean(content)
 
-        structure = self._content["ProjectStructure"].get("Content")
-        if structure:
-            self._clean_structure(structure)
 
-        paths = sorted(self._exclude, key=lambda x: x.count('.'), reverse=True)
-        for path in paths:
-            parts = path.split('.')
-            particle = self._content
-            for part in parts[:-1]:
-                particle = particle[part]
-            part = parts[-1]
-            del particle[part]
-        return self._content
+def dump(data, clean_content):
+    """
+    Write the cleaned data structure to the JSON file ``clean_content``.
+    """
+    with open(clean_content, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, separators=(',', ': '), sort_keys=True, ensure_ascii=False)
 
 
-def clean(content=None, clean_content=None):
+@trace.traced('clean')
+def clean(content=None, clean_content=None, stream=False):
     """
     Tries to remove (clean) some parts of the original content
     and generate a cleaned version of the original file.
@@ -284,12 +464,14 @@ def clean(content=None, clean_content=None):
                     we try to use the first content file in the current working directory.
     :param clean_content: Optional. The path to the cleaned version of the JSON file.
                           If clean_content is None, we try to set it to ``./<content>.clean.json``
+    :param stream: Optional. Clean the content particle by particle and write a compact JSON file.
+                   The memory usage stays bounded for huge content files.
     :return: 0 = successful
     """
     if content is None:
         files = fnmatch.filter(os.listdir('.'), core.EXT_JSON)
         for f in files:
-            if not fnmatch.fnmatch(f, core.EXT_CLEAN_JSON):
+            if not fnmatch.fnmatch(f, core.EXT_CLEAN_JSON) and not fnmatch.fnmatch(f, core.EXT_SYMBOLS_JSON):
                 content = f
                 break
 
@@ -297,19 +479,13 @@ def clean(content=None, clean_content=None):
         raise ContentError('Not able to find the content file')
     content = os.path.abspath(content)
 
-    conf_file = os.path.join(os.path.dirname(content), 'clean.conf')
-
     if clean_content is None:
         content_base_name = '.'.join([c for c in content.split('.') if c not in ['clean', 'json']])
         clean_content = "{0}.clean{1}".format(content_base_name, os.path.splitext(content)[1])
     clean_content = os.path.abspath(clean_content)
 
-    cleaner = Cleaner(conf_file_path=conf_file)
-    content = cleaner.clean(content)
-    if not os.path.isfile(conf_file):
-        cleaner.dump_conf(conf_file)
-
-    with open(clean_content, 'w', encoding='utf-8') as f:
-        json.dump(content, f, indent=4, separators=(',', ': '), sort_keys=True, ensure_ascii=False)
-
+    if stream:
+        _cleaner(content).clean_stream(content, clean_content)
+    else:
+        dump(clean_data(content), clean_content)
     return 0
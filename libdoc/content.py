@@ -4,6 +4,8 @@ Encapsulate the logic for the content JSON file
 
 import base64
 import codecs
+import copy
+import fnmatch
 import hashlib
 import sys
 import os
@@ -21,9 +23,8 @@ from typing import Dict, List, Tuple, Any
 from pytz import utc, timezone
 from babel.dates import format_datetime
 from babel import Locale
-from slugify import slugify
 
-from . import core
+from . import core, trace
 from .exceptions import ContentError
 from .core import escape_iec_names as se
 from .transformer import create_builder_state, STATE
@@ -98,16 +99,12 @@ class PathMap:
 
 class Particle(ABC):
 
-    _path_map = None
-
     def __init__(self, content, key, element, path):
-        if Particle._path_map is None:
-            Particle._path_map = content._path_map
-
+        self._path_map = content._path_map
         self._content = content
         self._key = key
         self._element = element
-        self._path, self._slug = Particle._path_map.hash(path, self.name)
+        self._path, self._slug = self._path_map.hash(path, self.name)
         self._suffix = Path(core.EXT_RST).suffix
         self._get_suffix = True
         self._master_doc = core.INDEX_RST
@@ -121,6 +118,13 @@ class Particle(ABC):
     def normalized_name(self):
         pass
 
+    @property
+    def object(self):
+        """
+        The ProjectStructure object of the particle (e.g. ``POUs.FB_Axis``) or ``None`` for folders and the index.
+        """
+        return self._element.get("Object")
+
     @property
     def has_sub_particles(self):
         return len(list(self.children)) != 0
@@ -229,6 +233,24 @@ class OParticle(Particle):
     def has_inherited_particles(self) -> bool:
         return len(self._inherited_particle_refs) > 0
 
+    @property
+    def used_by(self) -> List[str]:
+        """
+        The names of the library objects which use this object as a type (top level objects only).
+        """
+        if len(self._element["Object"].split('.')) != 2:
+            return []
+        return self._content.references.used_by(self._particle.get("Name", ''))
+
+    @property
+    def implementers(self) -> List[str]:
+        """
+        The names of the library objects which implement this interface.
+        """
+        if len(self._element["Object"].split('.')) != 2:
+            return []
+        return self._content.references.implementers(self._particle.get("Name", ''))
+
     @property
     def name(self) -> str:
         path = self._element["Object"].split('.')
@@ -278,8 +300,8 @@ class OParticle(Particle):
 
     @property
     def sub_particle_path(self) -> str:
-        path = os.path.join(Particle._path_map.path(self.path), f'pou-{self.name}')
-        return Particle._path_map.hash(path, self._key)[0]
+        path = os.path.join(self._path_map.path(self.path), f'pou-{self.name}')
+        return self._path_map.hash(path, self._key)[0]
 
     @property
     def toc(self):
@@ -291,13 +313,13 @@ class OParticle(Particle):
                 key = ''
                 if "Object" in element:
                     key = element["Object"].split('.')[-1]
-                    path = os.path.join(Particle._path_map.path(self._path), 'pou-' + name)
-                    hash_path, slug = Particle._path_map.get_hash(path, key)
+                    path = os.path.join(self._path_map.path(self._path), 'pou-' + name)
+                    hash_path, slug = self._path_map.get_hash(path, key)
                     toc.append('/'.join(['', hash_path.replace('\\', '/'), slug]))
                 elif "Folder" in element:
                     folder = key = core.normalize(element["Folder"])
-                    path = os.path.join(Particle._path_map.path(self._path), 'pou-' + name, folder)
-                    toc.append('/'.join(['', Particle._path_map.hash(path, self._key)[0].replace('\\', '/'), 'fld-' + folder]))
+                    path = os.path.join(self._path_map.path(self._path), 'pou-' + name, folder)
+                    toc.append('/'.join(['', self._path_map.hash(path, self._key)[0].replace('\\', '/'), 'fld-' + folder]))
                 keys.append(key)
             toc = list(zip(keys, toc))
             toc.sort(key=lambda k: k[0])
@@ -320,23 +342,23 @@ class OParticle(Particle):
             symbols = self._content.symbols
             if "Extends" in particle:
                 symbol = particle["Extends"]["Class"]
-                if symbol in symbols:
+                if symbols.has_ref(symbol):
                     pattern = r'\b({0})\b'.format(re.escape(symbol))
                     text = re.sub(pattern, r"|d\1|", text, flags=re.UNICODE)
-                    links.add(".. |d{0}| replace:: :ref:`{0}<{1}>`".format(symbol, symbols[symbol]))
+                    links.add(".. |d{0}| replace:: {1}".format(symbol, symbols.ref(symbol)))
             if "Implements" in particle:
                 symbol_list = particle["Implements"]
                 for symbol in symbol_list:
-                    if symbol in symbols:
+                    if symbols.has_ref(symbol):
                         pattern = r'\b({0})\b'.format(re.escape(symbol))
                         text = re.sub(pattern, r"|d\1|", text, flags=re.UNICODE)
-                        links.add(".. |d{0}| replace:: :ref:`{0}<{1}>`".format(symbol, symbols[symbol]))
+                        links.add(".. |d{0}| replace:: {1}".format(symbol, symbols.ref(symbol)))
             if "ReturnType" in particle:
                 symbol = particle["ReturnType"]
-                if symbol in symbols:
+                if symbols.has_ref(symbol):
                     pattern = r'\b({0})\b'.format(re.escape(symbol))
                     text = re.sub(pattern, r"|d\1|", text, flags=re.UNICODE)
-                    links.add(".. |d{0}| replace:: :ref:`{0}<{1}>`".format(symbol, symbols[symbol]))
+                    links.add(".. |d{0}| replace:: {1}".format(symbol, symbols.ref(symbol)))
             text = ' '.join([se(t) for t in text.split(' ')])
             text = "{0}\n\n{1}".format(text, '\n'.join(links))
         return text
@@ -419,17 +441,17 @@ class OParticle(Particle):
                 if "Verbatim" in typedef and "BaseType" in typedef:
                     base_type = typedef["BaseType"]["Class"]
                     verbatim = typedef["Verbatim"]
-                    if base_type in symbols and verbatim.find(base_type) != -1:
+                    if symbols.has_ref(base_type) and verbatim.find(base_type) != -1:
                         pattern = r'\b({0})\b'.format(re.escape(base_type))
                         o_type = re.sub(pattern, r"|io\1|", verbatim, flags=re.UNICODE)
-                        links.add(".. |io{0}| replace:: :ref:`{0}<{1}>`".format(base_type, symbols[base_type]))
+                        links.add(".. |io{0}| replace:: {1}".format(base_type, symbols.ref(base_type)))
                     else:
                         o_type = ' '.join([se(t) for t in typedef.get("Verbatim", '').split(' ')])
                 else:
                     o_type = typedef.get("Class", '')
-                    if o_type in symbols:
+                    if symbols.has_ref(o_type):
                         link = "|io{0}|".format(o_type)
-                        links.add(".. |io{0}| replace:: :ref:`{0}<{1}>`".format(o_type, symbols[o_type]))
+                        links.add(".. |io{0}| replace:: {1}".format(o_type, symbols.ref(o_type)))
                         o_type = link
                     else:
                         if "Verbatim" in typedef:
@@ -461,10 +483,10 @@ class OParticle(Particle):
 
                 address = variable.get("Address", '')
                 symbol = variable.get("InheritedFrom", '')
-                if symbol and symbol in symbols:
+                if symbol and symbols.has_ref(symbol):
                     # inherited_from = ".. index::\n   single: Base; {0}\n\n|io{0}|".format(symbol)
                     inherited_from = "|io{0}|".format(symbol)
-                    links.add(".. |io{0}| replace:: :ref:`{0}<{1}>`".format(symbol, symbols[symbol]))
+                    links.add(".. |io{0}| replace:: {1}".format(symbol, symbols.ref(symbol)))
                 else:
                     inherited_from = se(symbol)
 
@@ -484,10 +506,10 @@ class OParticle(Particle):
                     new_comment = comment
                     for match in re.finditer(core.SYMBOL_REF_REGEX, comment):
                         symbol = match.group(1)
-                        if symbol in symbols:
+                        if symbols.has_ref(symbol):
                             pattern = r'\|({0})\|'.format(re.escape(symbol))
                             new_comment = re.sub(pattern, r"|io\1|", new_comment, flags=re.UNICODE)
-                            links.add(".. |io{0}| replace:: :ref:`{0}<{1}>`".format(symbol, symbols[symbol]))
+                            links.add(".. |io{0}| replace:: {1}".format(symbol, symbols.ref(symbol)))
                     comments = OParticle.clean(new_comment)
                     if len(comments) == 1:
                         comment = comments[0]
@@ -619,8 +641,8 @@ class OParticle(Particle):
         doc = self._substitute_filenames('\n'.join(OParticle.clean(self._raw_doc)))
         for match in re.finditer(core.SYMBOL_REF_REGEX, doc):
             symbol = match.group(1)
-            if symbol in symbols:
-                symbol_refs.add(".. |{0}| replace:: :ref:`{0}<{1}>`".format(symbol, symbols[symbol]))
+            if symbols.has_ref(symbol):
+                symbol_refs.add(".. |{0}| replace:: {1}".format(symbol, symbols.ref(symbol)))
         refs = '\n'.join([t for t in symbol_refs])
         return "{0}\n\n{1}".format(doc, refs) if refs else doc
 
@@ -796,9 +818,9 @@ class FParticle(Particle):
                     if part == "Visualizations":
                         continue
                     name = key = element["Object"].split('.')[-1]
-                    path = Particle._path_map.path(self._path)
+                    path = self._path_map.path(self._path)
                     if path:
-                        hash_path, slug = Particle._path_map.get_hash(path, name)
+                        hash_path, slug = self._path_map.get_hash(path, name)
                         toc.append(
                             '/'.join(['', hash_path.replace('\\', '/'), slug]))
                     else:
@@ -811,10 +833,10 @@ class FParticle(Particle):
                                            "on the same level can't be handled properly".format(name=name))
                     folder_check.add(name)
                     normalized_name = core.normalize(name)
-                    path = os.path.join(Particle._path_map.path(self._path), normalized_name)
+                    path = os.path.join(self._path_map.path(self._path), normalized_name)
                     if path:
                         toc.append(
-                            '/'.join(['', Particle._path_map.hash(path, self._key)[0].replace('\\', '/'), 'fld-' + normalized_name]))
+                            '/'.join(['', self._path_map.hash(path, self._key)[0].replace('\\', '/'), 'fld-' + normalized_name]))
                     else:
                         toc.append('/'.join(['', 'fld-' + normalized_name]))
                 keys.append(key)
@@ -832,8 +854,8 @@ class FParticle(Particle):
             doc = self._substitute_filenames(text)
             for match in re.finditer(core.SYMBOL_REF_REGEX, doc):
                 symbol = match.group(1)
-                if symbol in symbols:
-                    symbol_refs.add(".. |{0}| replace:: :ref:`{0}<{1}>`".format(symbol, symbols[symbol]))
+                if symbols.has_ref(symbol):
+                    symbol_refs.add(".. |{0}| replace:: {1}".format(symbol, symbols.ref(symbol)))
             refs = '\n'.join([t for t in symbol_refs])
             return "{0}\n\n{1}".format(doc, refs) if refs else doc
         else:
@@ -869,8 +891,8 @@ class IParticle(FParticle):
             symbol_refs = set()
             for match in re.finditer(core.SYMBOL_REF_REGEX, doc):
                 symbol = match.group(1)
-                if symbol in symbols:
-                    symbol_refs.add(".. |{0}| replace:: :ref:`{0}<{1}>`".format(symbol, symbols[symbol]))
+                if symbols.has_ref(symbol):
+                    symbol_refs.add(".. |{0}| replace:: {1}".format(symbol, symbols.ref(symbol)))
             refs = '\n'.join([t for t in symbol_refs])
             return "{0}\n\n{1}".format(doc, refs) if refs else doc
         else:
@@ -921,24 +943,20 @@ class ContentInfo(Mapping):
         self._info = info
         self._file_header = info["FileHeader"]
         self._project_information = info["ProjectInformation"]
+        # qualified ("FileHeader.version") and unqualified ("version") keys, the FileHeader wins.
+        # The index keeps (mapping, key) pairs, so it sees the localized dates of Content.config
+        self._index = {}
+        for key in self._file_header:
+            self._index["FileHeader." + key] = self._index[key] = (self._file_header, key)
+        for key, value in self._project_information.items():
+            self._index["ProjectInformation." + key] = (value, "Content")
+            self._index.setdefault(key, (value, "Content"))
 
     def __getitem__(self, key):
-        parts = ("FileHeader", "ProjectInformation")
-        if '.' in key:
-            part, key = key.split('.')
-            if part in parts and key in self._info[part]:
-                if part == "ProjectInformation":
-                    return self._project_information[key]["Content"]
-                else:
-                    return self._file_header[key]
-        else:
-            for part in parts:
-                    if key in self._info[part]:
-                        if part == "ProjectInformation":
-                            return self._project_information[key]["Content"]
-                        else:
-                            return self._file_header[key]
-        return None
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        return entry[0][entry[1]]
 
     def __len__(self):
         return len(self._project_information) + len(self._file_header)
@@ -950,15 +968,7 @@ class ContentInfo(Mapping):
             yield "ProjectInformation.{0}".format(key)
 
     def __contains__(self, key):
-        parts = ("FileHeader", "ProjectInformation")
-        if '.' in key:
-            part, key = key.split('.')
-            return part in parts and key in self._info[part]
-        else:
-            for part in parts:
-                if key in self._info[part]:
-                    return True
-        return False
+        return key in self._index
 
     @property
     def info_table(self):
@@ -1022,11 +1032,29 @@ class Libraries(Mapping):
 
     def __init__(self, info):
         self._cache = {}
+        self._by_name = {}
+        self._by_namespace = {}
         for key, lib in info.items():
             lib['Key'] = key
-            self._cache[key] = LibraryInfo(lib)
+            library = self._cache[key] = LibraryInfo(lib)
+            if 'Name' in lib:
+                self._by_name.setdefault(lib['Name'], library)
+            if lib.get('Namespace'):
+                self._by_namespace.setdefault(lib['Namespace'], library)
         self._list = sorted(self._cache.values(), key=lambda x: x['Name'])
 
+    def by_name(self, name):
+        """
+        :return: The library with the name ``name`` or ``None``.
+        """
+        return self._by_name.get(name)
+
+    def by_namespace(self, namespace):
+        """
+        :return: The library which is referenced by the namespace ``namespace`` or ``None``.
+        """
+        return self._by_namespace.get(namespace)
+
     def __getitem__(self, key):
         item = self._cache[key]
         return item
@@ -1059,20 +1087,21 @@ class Configuration(Mapping):
         return self._config.get(key, default)
 
 
-class Symbols(Mapping):
+def excluded_from_build(symbol):
+    if "ObjectType" not in symbol:
+        return True
+    if "ObjectProperties" in symbol:
+        for prop in symbol["ObjectProperties"]:
+            if prop["Name"] == "ExcludeFromBuildLocal" and prop["Value"] == "true":
+                return True
+    return False
 
-    def __init__(self, areas):
 
-        def excluded_from_build(symbol):
-            if "ObjectType" not in symbol:
-                return True
-            if "ObjectProperties" in symbol:
-                for prop in symbol["ObjectProperties"]:
-                    if prop["Name"] == "ExcludeFromBuildLocal" and prop["Value"] == "true":
-                        return True
-            return False
+class Symbols(Mapping):
 
+    def __init__(self, areas):
         self._symbols = {}
+        self._external = {}  #: The symbols of the referenced libraries as ``(base url, location)``
         for area in areas:
             for symbols in area.values():
                 # todo: remove this, after json is fixed
@@ -1110,6 +1139,40 @@ class Symbols(Mapping):
                             # additional register global variables and enum members without prefix
                             self._symbols[key] = qualified_name.replace(':', '.')
 
+    def add_library(self, index, namespace=None):
+        """
+        Add the symbols of a referenced library from its symbol index (see :func:`load_symbol_indexes`).
+        The symbols are registered with and without the ``namespace`` of the library.
+        The own symbols and the symbols of the previously added libraries take precedence.
+        """
+        base = index['url']
+        prefix = namespace.upper() + '.' if namespace else None
+        for key, location in index['symbols'].items():
+            self._external.setdefault(key, (base, location))
+            if prefix is not None:
+                self._external.setdefault(prefix + key, (base, location))
+
+    def ref(self, symbol, text=None):
+        """
+        :return: The reStructuredText link to ``symbol``: a ``:ref:`` to an own symbol
+                 or a hyperlink into the documentation of a referenced library.
+        """
+        key = symbol.upper()
+        if text is None:
+            text = symbol
+        if key in self._symbols:
+            return ":ref:`{0}<{1}>`".format(text, self._symbols[key])
+        base, location = self._external[key]
+        return "`{0} <{1}{2}>`__".format(text, base, location)
+
+    def has_ref(self, symbol):
+        """
+        :return: ``True`` if :meth:`ref` can link ``symbol``: an own symbol or a symbol of a referenced library.
+                 The mapping itself holds the own symbols only.
+        """
+        key = symbol.upper()
+        return key in self._symbols or key in self._external
+
     def add_symbol(self, symbol, target=None):
         if target is None:
             target = symbol
@@ -1128,6 +1191,110 @@ class Symbols(Mapping):
             yield key
 
 
+class References(object):
+    """
+    The reference graph of the library symbols, built in a single pass over the symbol areas.
+
+    The graph has the following edges between the top level objects (data types, POUs, interfaces, GVLs):
+
+    * ``uses``: the types of the variables, members, return types and of the methods and properties,
+    * ``extends``: the ``Extends`` base,
+    * ``implements``: the ``Implements`` interfaces,
+    * ``inherits``: the ``InheritedFrom`` origins of the variables, methods and properties.
+
+    All lookups are dictionary lookups (IEC names are case insensitive) and return sorted names,
+    e.g. ``content.references.used_by('ST_Data')`` inside a template.
+    """
+
+    def __init__(self, areas):
+        self._uses = {}
+        self._used_by = {}
+        self._extended_by = {}
+        self._implementers = {}
+        self._inheritors = {}
+        for area in areas:
+            for symbol in area.values():
+                # todo: remove this, after json is fixed
+                if symbol is None or excluded_from_build(symbol):
+                    continue
+                name = symbol["Name"]
+                for type_name in self._types(symbol):
+                    self._add(self._uses, name, type_name)
+                    self._add(self._used_by, type_name, name)
+                if "Extends" in symbol:
+                    self._add(self._extended_by, symbol["Extends"].get("Class"), name)
+                for interface in symbol.get("Implements", ()):
+                    self._add(self._implementers, interface, name)
+                for child in self._children(symbol):
+                    if child.get("InheritedFrom"):
+                        self._add(self._inheritors, child["InheritedFrom"], name)
+        for edges in (self._uses, self._used_by, self._extended_by, self._implementers, self._inheritors):
+            for key, names in edges.items():
+                edges[key] = sorted(names.values(), key=str.upper)
+
+    @staticmethod
+    def _add(edges, key, name):
+        if key and name and key.upper() != name.upper():
+            edges.setdefault(key.upper(), {})[name.upper()] = name
+
+    @staticmethod
+    def _children(symbol):
+        for variable in symbol.get("Variables", ()):
+            yield variable
+        for member in symbol.get("Members", ()):
+            yield member
+        for area in ("Methods", "Properties"):
+            for child in (symbol.get(area) or {}).values():
+                if child is not None:
+                    yield child
+
+    @classmethod
+    def _types(cls, symbol):
+        if isinstance(symbol.get("ReturnType"), str):
+            yield symbol["ReturnType"]
+        for child in cls._children(symbol):
+            typedef = child.get("Type")
+            if isinstance(typedef, dict):
+                yield typedef.get("Class")
+                yield (typedef.get("BaseType") or {}).get("Class")
+            if isinstance(child.get("ReturnType"), str):
+                yield child["ReturnType"]
+            for variable in child.get("Variables", ()):  # of methods
+                typedef = variable.get("Type") or {}
+                yield typedef.get("Class")
+                yield (typedef.get("BaseType") or {}).get("Class")
+
+    def uses(self, name):
+        """
+        :return: The names of the types used by ``name``.
+        """
+        return self._uses.get(name.upper(), [])
+
+    def used_by(self, name):
+        """
+        :return: The names of the objects which use the type ``name``.
+        """
+        return self._used_by.get(name.upper(), [])
+
+    def extended_by(self, name):
+        """
+        :return: The names of the objects which extend ``name`` directly.
+        """
+        return self._extended_by.get(name.upper(), [])
+
+    def implementers(self, name):
+        """
+        :return: The names of the objects which implement the interface ``name``.
+        """
+        return self._implementers.get(name.upper(), [])
+
+    def inheritors(self, name):
+        """
+        :return: The names of the objects with variables, methods or properties inherited from ``name``.
+        """
+        return self._inheritors.get(name.upper(), [])
+
+
 class ExternalFiles(Mapping):
 
     def __init__(self, files):
@@ -1148,11 +1315,109 @@ class ExternalFiles(Mapping):
         return self._files[key]
 
 
-class Content(object):
+_snapshots = {}  #: Parsed content files by path as ``(stat key, data)``, see :func:`keep_snapshots`
+_snapshot_limit = 0  #: The number of kept content files. 0 disables the snapshots
+_snapshot_counts = {'hits': 0, 'misses': 0}
+
+
+def keep_snapshots(count=core.SERVE_SNAPSHOTS):
+    """
+    Keep up to ``count`` parsed content files for the following :class:`Content` objects of the process
+    (e.g. ``libdoc serve-daemon``). A snapshot is valid as long as the size and the modification time
+    of its file are unchanged. ``0`` disables the snapshots.
+    """
+    global _snapshot_limit
+    _snapshot_limit = count
+    if not count:
+        _snapshots.clear()
+
+
+def snapshot_stats():
+    """
+    :return: A dict with the ``hits``, ``misses`` and ``size`` of the content snapshots.
+    """
+    return dict(_snapshot_counts, size=len(_snapshots))
 
-    def __init__(self, content_file_path, condensed=False, slug=0):
+
+def load_content(content_file_path):
+    """
+    :return: The parsed content file, taken from the snapshots if possible.
+    """
+    if not _snapshot_limit:
         with codecs.open(content_file_path, 'r', encoding='utf-8') as f:
-            self._content = json.load(f)
+            return json.load(f)
+    path = os.path.abspath(content_file_path)
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    entry = _snapshots.pop(path, None)
+    if entry is None or entry[0] != key:
+        _snapshot_counts['misses'] += 1
+        with codecs.open(path, 'r', encoding='utf-8') as f:
+            entry = key, json.load(f)
+    else:
+        _snapshot_counts['hits'] += 1
+    _snapshots[path] = entry  # the most recently used snapshot is the last one
+    while len(_snapshots) > _snapshot_limit:
+        del _snapshots[next(iter(_snapshots))]
+    # a Content writes the localized dates and the file name into the header parts
+    data = dict(entry[1])
+    for part in ("FileHeader", "ProjectInformation"):
+        data[part] = copy.deepcopy(data[part])
+    return data
+
+
+_symbol_indexes = {}  #: Loaded symbol indexes by path as ``(stat key, index)``
+
+
+def _version_key(version):
+    return tuple(int(part) if part.isdigit() else -1 for part in (version or '').split('.'))
+
+
+def load_symbol_indexes(locations=None):
+    """
+    Load the symbol indexes ``*.symbols.json`` of the referenced libraries
+    (see :func:`~libdoc.transform.write_symbols`). Unchanged index files are loaded once per process.
+
+    :param locations: Optional. The index folders or files. Defaults to the ';' separated list
+                      of the environment variable ``LIBDOC_SYMBOLS``.
+    :return: A mapping of the library titles to lists of their indexes.
+    """
+    if locations is None:
+        locations = [location for location in os.environ.get(core.LIBDOC_SYMBOLS, "").split(';') if location]
+    indexes = {}
+    for location in locations:
+        if os.path.isdir(location):
+            files = sorted(os.path.join(location, f) for f in fnmatch.filter(os.listdir(location),
+                                                                             core.EXT_SYMBOLS_JSON))
+        else:
+            files = [location]
+        for path in files:
+            path = os.path.abspath(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            key = (stat.st_mtime_ns, stat.st_size)
+            entry = _symbol_indexes.get(path)
+            if entry is None or entry[0] != key:
+                with codecs.open(path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                # without a published url the links point to the local documentation next to the index
+                if not index.get('url'):
+                    index['url'] = Path(os.path.dirname(path)).as_uri() + '/'
+                entry = _symbol_indexes[path] = key, index
+            index = entry[1]
+            indexes.setdefault(index['library']['title'], []).append(index)
+    return indexes
+
+
+class Content(object):
+
+    @trace.traced('content')
+    def __init__(self, content_file_path, condensed=False, slug=0, data=None):
+        if data is None:  # otherwise the content is already loaded (e.g. cleaned in memory)
+            data = load_content(content_file_path)
+        self._content = data
         self._config_dir = os.path.dirname(content_file_path)
         self._content_file_name = os.path.basename(content_file_path)
         self._content["FileHeader"]["contentFile"] = os.path.basename(self._content_file_name)
@@ -1176,6 +1441,17 @@ class Content(object):
 
         self._symbols = Symbols((self._content["DataTypes"], self._content["Interfaces"],
                                  self._content["POUs"], self._content["GlobalObjects"]))
+        indexes = load_symbol_indexes()
+        if indexes:
+            for library in self._libraries.values():
+                candidates = indexes.get(library.get('Name'))
+                if candidates:
+                    # the resolved version of the library or the newest one
+                    version = library.get('Version', '').strip()
+                    index = max(candidates, key=lambda i: (i['library'].get('version') == version,
+                                                           _version_key(i['library'].get('version'))))
+                    self._symbols.add_library(index, library.get('Namespace'))
+        self._references = None
         self._external_refs = {}
         self._external_files = ExternalFiles(self._content.get("ExternalFiles"))
 
@@ -1250,6 +1526,14 @@ class Content(object):
         element = self._content["ProjectStructure"]
         if "Content" in element:
             traverse(element["Content"])
+        trace.count('particles', len(self._particle_list))
+
+    @property
+    def data(self):
+        """
+        The parsed content.
+        """
+        return self._content
 
     @property
     def symbols(self):
@@ -1275,6 +1559,16 @@ class Content(object):
     def external_files(self):
         return self._external_files
 
+    @property
+    def references(self):
+        """
+        The :class:`References` graph of the library symbols, built on first access.
+        """
+        if self._references is None:
+            self._references = References((self._content["DataTypes"], self._content["Interfaces"],
+                                           self._content["POUs"], self._content["GlobalObjects"]))
+        return self._references
+
     @property
     def condensed(self):
         return self._condensed
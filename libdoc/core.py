@@ -9,13 +9,17 @@ All was is necessary...
 
 import json
 import codecs
+import copy
+import functools
+import hashlib
 import os
 import re
 import sys
+import types
 from string import ascii_letters, digits
-from unidecode import unidecode
 
 from .exceptions import BuilderError, LibDocError
+from .transformer import STATE
 
 # Environment keys
 LIBDOC_CODESYS = "LIBDOC_CODESYS"  #: Path and profile name of the responsible CODESYS.EXE
@@ -25,11 +29,14 @@ LIBDOC_HHC = "LIBDOC_HHC"  #: Path of the responsible Microsoft HTML Help Compil
 PROGRAMFILES = "PROGRAMFILES"
 LIBDOC_LOCALISATION = "LIBDOC_LOCALISATION"  #: comma separated list of language codes(e.g. "de, it, fr")
 LIBDOC_SOURCE_LANGUAGE = "LIBDOC_SOURCE_LANGUAGE"  #: language of the reStruturedText files. Default: "en-US". Example: "de-DE"
+LIBDOC_CACHE = "LIBDOC_CACHE"  #: The folder of the export cache. Default: "~/.libdoc/cache"
+LIBDOC_SYMBOLS = "LIBDOC_SYMBOLS"  #: List of symbol index folders or files of referenced libraries (';' separated)
 
 # Filter constants
 EXT_LIBRARY = "*.library"
 EXT_JSON = "*.json"
 EXT_CLEAN_JSON = "*.clean.json"
+EXT_SYMBOLS_JSON = "*.symbols.json"
 EXT_RST = "*.rst"
 EXT_PY = "*.py"
 EXT_DCL = "*.dcl"
@@ -59,7 +66,20 @@ LIBS_RST = 'libraries.rst'  #: The name of the libraries document
 KINEMATIC_RST = 'kinematic.rst'  #: The name of the kinematic document
 FRAME_JSON = 'frame.json'  #: The name of the frame info document
 MANIFEST_JSON = 'manifest.json'  #: The name of the manifest document for lmd archives
+SYMBOLS_JSON = 'symbols.json'  #: The name of the symbol table of the frame
 CONFIG_JSON = 'config.json' # The name of the libdoc configuration file
+MAKE_STATE_JSON = '.make_state.json'  #: The name of the stage fingerprint record of ``libdoc make``
+POT_DIGESTS_JSON = '.pot_digests.json'  #: The name of the message-id digest record inside a locale folder
+BATCH = 'Batch'  #: The name of the default work folder of ``libdoc batch``
+BATCH_LOG = 'make.log'  #: The name of the per-library log file of ``libdoc batch``
+EXPORT_LOG_SUFFIX = '.export.log'  #: The suffix of the log file of a concurrent export
+CACHE_PATH = ('.libdoc', 'cache')  #: The path components of the default cache folder inside the home folder
+SERVE_PORT = 8377  #: The default local TCP port of ``libdoc serve-daemon``
+SERVE_SNAPSHOTS = 4  #: The number of parsed content files kept by ``libdoc serve-daemon``
+SERVE_TOKEN = 'serve-{0}.token'  #: The name of the access token file of ``libdoc serve-daemon`` for a port
+SERVE_IDLE_TIMEOUT = 10  #: Seconds until ``libdoc serve-daemon`` closes a connection without requests
+WATCH_INTERVAL = 0.25  #: The default polling interval of ``libdoc watch`` in seconds
+WATCH_DEBOUNCE = 0.1  #: The quiet time in seconds before ``libdoc watch`` handles the collected changes
 SUPPORT_FILES = (INFO_RST, LIBS_RST)
 PROFILE_PATH = ("EcoStruxure Machine Expert", "V1.2")  #: The path components to the profile folder
 # libdoc path: C:\Program Files\Schneider Electric\EcoStruxure Machine Expert\V1.2\LogicBuilder\DocScripting\3.5.12.60
@@ -105,6 +125,13 @@ SYMBOL_REF_REGEX = re.compile(r'(?<!\.\. )\|(?P<symbol>\S.*?)\|', re.UNICODE)
 
 FILE_PATH_REGEX = re.compile(r'\B@\((?P<key>.+?)\)\B', re.UNICODE)
 
+#: A line of a Sphinx ``objects.inv``: ``<name> <domain>:<role> <priority> <location> <display name>``
+INVENTORY_LINE_REGEX = re.compile(r'(?x)(.+?)\s+(\S*:\S*)\s+(\S+)\s+(\S+)\s+(.*)', re.UNICODE)
+#: The insignificant whitespace between JSON tokens
+JSON_WHITESPACE_REGEX = re.compile(r'[ \t\n\r]*')
+#: The characters which can follow a complete JSON number
+JSON_NUMBER_END = frozenset(',}] \t\n\r')
+
 # header for iotbl
 IOTBL_FB_ATTRIBUTES = IOTBL_VR_ATTRIBUTES = 'Attributes'
 IOTBL_SCOPE = 'Scope'
@@ -149,18 +176,35 @@ ALL_CHARS = str.maketrans('', '')
 WRONG_CHARS = ''.join(set(ALL_CHARS) - set(VALID_FILENAME_CHARS))
 
 
+NAME_CACHE_SIZE = 8192  #: The number of names memoized by :func:`normalize` and the escape functions
+_REPEATED_SEPARATORS = re.compile(r"(?P<vc>[._-])(?P=vc)+")
+_NAME_CHARS = frozenset(ascii_letters + digits + '_')
+
+
+@functools.lru_cache(maxsize=NAME_CACHE_SIZE, typed=True)
 def normalize(filename):
     """
     http://stackoverflow.com/questions/295135/turn-a-string-into-a-valid-filename-in-python
+
+    The results are memoized, see :func:`name_cache_stats`.
+    Plain ASCII names skip the transliteration.
     """
+    if filename.isascii():
+        if _NAME_CHARS.issuperset(filename) and '__' not in filename:
+            return filename
+        return _REPEATED_SEPARATORS.sub(r"\g<vc>", filename)
+    from unidecode import unidecode
     cleaned_filename = unidecode(filename).encode('ASCII', 'ignore')
     normalized_filename = cleaned_filename
     #normalized_filename = cleaned_filename.translate(str.maketrans('', '', WRONG_CHARS.decode('ascii') if type(WRONG_CHARS) == bytes else ''))
-    return re.sub(r"(?P<vc>[._-])(?P=vc)+", r"\g<vc>", normalized_filename.decode('ascii'))
+    return _REPEATED_SEPARATORS.sub(r"\g<vc>", normalized_filename.decode('ascii'))
 
 
+@functools.lru_cache(maxsize=NAME_CACHE_SIZE, typed=True)
 def escape_iec_names(name):
     assert isinstance(name, str)  # Changed from unicode
+    if '_' not in name:
+        return name
     name = name.replace('_.', '\_.')
     if name.startswith('_'):
         name = '\_{n}'.format(n=name[1:])
@@ -169,34 +213,223 @@ def escape_iec_names(name):
     return name
 
 
+@functools.lru_cache(maxsize=NAME_CACHE_SIZE, typed=True)
 def escape_folder_names(name):
     assert isinstance(name, str)  # Changed from unicode
     return name.replace('.', '\.').replace('_', '\_').replace(':', '\:')
 
 
+def name_cache_stats():
+    """
+    The counters of the memoized name functions, e.g. for profiling a ``generate`` run.
+
+    :return: A mapping of the function names to dicts with ``hits``, ``misses``, ``size`` and ``hit_rate``.
+    """
+    stats = {}
+    for function in (normalize, escape_iec_names, escape_folder_names):
+        info = function.cache_info()
+        calls = info.hits + info.misses
+        stats[function.__name__] = {'hits': info.hits, 'misses': info.misses, 'size': info.currsize,
+                                    'hit_rate': info.hits / calls if calls else 0.0}
+    return stats
+
+
+def clear_name_caches():
+    """
+    Forget all memoized names and reset the counters.
+    """
+    for function in (normalize, escape_iec_names, escape_folder_names):
+        function.cache_clear()
+
+
+_environments = {}  #: Jinja environments by template locations, see :func:`template_environment`
+
+
+def template_environment():
+    """
+    The Jinja environment of the templates in ``LIBDOC_TEMPLATES`` and the libdoc templates folder.
+
+    One environment is kept per list of template locations, so all commands of a process share
+    the compiled templates. Jinja reloads a template as soon as its file changes.
+    """
+    locations = os.environ.get(LIBDOC_TEMPLATES, "").split(';')
+    locations = [l for l in locations if os.path.isdir(l)]
+    locations.append(os.path.join(os.path.abspath(get_base_dir()), TEMPLATES))
+    env = _environments.get(tuple(locations))
+    if env is None:
+        from jinja2 import Environment, FileSystemLoader
+        env = Environment(loader=FileSystemLoader(locations), trim_blocks=True, lstrip_blocks=True)
+        env.filters['se'] = escape_iec_names
+        env.filters['fe'] = escape_folder_names
+        _environments[tuple(locations)] = env
+    return env
+
+
+_conf_cache = {}  #: Evaluated ``conf.py`` namespaces, see :func:`read_conf`
+
+
+def _conf_key(config_file_path):
+    """
+    The cache key of a ``conf.py``: its location, modification time and content hash
+    together with the content hash of the builder state module it imports.
+    """
+    path = os.path.abspath(os.path.join(config_file_path, CONF))
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    try:
+        with open(os.path.join(config_file_path, STATE), 'rb') as f:
+            state_digest = hashlib.sha1(f.read()).hexdigest()
+    except FileNotFoundError:
+        state_digest = None
+    return path, os.path.getmtime(path), digest, state_digest
+
+
 def read_conf(config_file_path):
+    """
+    Evaluate the ``conf.py`` inside ``config_file_path`` and return its namespace.
+
+    The namespace is cached for the lifetime of the process, so all commands of one ``make`` run
+    share a single evaluation. A changed ``conf.py`` or builder state invalidates the cache entry.
+    Every call returns a deep copy, so the caller can change the values (e.g. ``html_theme_options``).
+    """
+    key = _conf_key(config_file_path)
+    conf = _conf_cache.get(key)
+    if conf is not None:
+        return _copy_namespace(conf)
+
     old_dir = os.getcwd()
     os.chdir(config_file_path)
     fs_encoding = sys.getfilesystemencoding()
     path = os.path.join(config_file_path, CONF).encode(fs_encoding)
     glb = {'__file__': path}
     conf = {}
-    with open(path, 'r', encoding='utf-8') as f:
-        exec(f.read(), glb, conf)  # Changed from execfile
-    os.chdir(old_dir)
-    return conf
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            exec(f.read(), glb, conf)  # Changed from execfile
+    finally:
+        os.chdir(old_dir)
+    _conf_cache[key] = conf
+    return _copy_namespace(conf)
 
 
-def exec_hook(hook_file_path, args):
-    if hook_file_path:
+def _copy_namespace(namespace):
+    # the imported modules cannot be copied, they are shared like the functions and classes
+    memo = {id(value): value for value in namespace.values() if isinstance(value, types.ModuleType)}
+    return copy.deepcopy(namespace, memo)
+
+
+def clear_conf_cache():
+    """
+    Forget all evaluated ``conf.py`` namespaces.
+    """
+    _conf_cache.clear()
+
+
+class HookContext(object):
+    """
+    The state of ``libdoc make`` handed over to a hook.
+
+    A hook script which defines a function ``run(context)`` is called with a :class:`HookContext`.
+    The attributes which are not known at the hook point are ``None``.
+
+    :param hook: The name of the hook point, e.g. ``AfterClean``.
+    :param args: The arguments of the hook point (``sys.argv`` of the classic hook scripts).
+    """
+
+    def __init__(self, hook, args, input=None, content_file=None, clean_content_file=None, data=None,
+                 condensed=None, frame=None, builder=None, output=None, result=None):
+        self.hook = hook
+        self.args = list(args)
+        self.input = input  #: The input of make (``*.library`` or ``*.json``)
+        self.content_file = content_file  #: The exported content
+        self.clean_content_file = clean_content_file  #: The location of the cleaned content
+        self.data = data  #: The cleaned content as loaded by make. Changes are seen by generate.
+        self.condensed = condensed
+        self.frame = frame
+        self.builder = builder
+        self.output = output  #: The requested product of the transform stage
+        self.result = result  #: The result of the stage (``After*`` hooks)
+        self._content = None
+
+    @property
+    def content(self):
+        """
+        The :class:`~libdoc.content.Content` of the cleaned content, created on first access
+        from the data already in memory.
+        """
+        if self._content is None:
+            from .content import Content
+            self._content = Content(self.clean_content_file, condensed=bool(self.condensed), slug=16,
+                                    data=self.data)
+        return self._content
+
+
+class Hook(object):
+    """
+    A compiled hook script.
+
+    Scripts with a top level function ``run(context)`` are executed once and ``run`` is called
+    for every invocation, without changing the working directory or ``sys.argv``.
+    Classic scripts are executed for every invocation inside their folder with ``sys.argv`` set to the
+    arguments of the hook point. Both are restored afterwards.
+    """
+
+    def __init__(self, hook_file_path, key):
+        import ast
+        self.path = hook_file_path
+        self.key = key
+        with open(hook_file_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        tree = ast.parse(source, hook_file_path)
+        self.legacy = not any(isinstance(node, ast.FunctionDef) and node.name == 'run' for node in tree.body)
+        self._code = compile(tree, hook_file_path, 'exec')
+        self._run = None
+        if not self.legacy:
+            namespace = {'__file__': hook_file_path, '__name__': os.path.splitext(os.path.basename(hook_file_path))[0]}
+            exec(self._code, namespace)
+            self._run = namespace['run']
+
+    def __call__(self, context):
+        if self._run is not None:
+            return self._run(context)
         glb = {}
         conf = {}
         old_dir = os.getcwd()
-        os.chdir(os.path.dirname(hook_file_path))
-        sys.argv = args
-        with open(hook_file_path, 'r', encoding='utf-8') as f:
-            exec(f.read(), glb, conf)  # Changed from execfile
-        os.chdir(old_dir)
+        old_argv = sys.argv
+        try:
+            os.chdir(os.path.dirname(self.path))
+            sys.argv = list(context.args)
+            exec(self._code, glb, conf)  # Changed from execfile
+        finally:
+            sys.argv = old_argv
+            os.chdir(old_dir)
+
+
+_hooks = {}  #: Compiled hook scripts by path, see :func:`load_hook`
+
+
+def load_hook(hook_file_path):
+    """
+    :return: The compiled :class:`Hook` of the script. It is compiled again after the script file changed.
+    """
+    path = os.path.abspath(hook_file_path)
+    stat = os.stat(path)
+    key = stat.st_mtime_ns, stat.st_size
+    hook = _hooks.get(path)
+    if hook is None or hook.key != key:
+        hook = _hooks[path] = Hook(path, key)
+    return hook
+
+
+def exec_hook(hook_file_path, args, context=None):
+    """
+    Run the hook script ``hook_file_path`` (if any).
+
+    :param args: The arguments of the hook point.
+    :param context: Optional. The :class:`HookContext`. Defaults to a context with ``args`` only.
+    """
+    if hook_file_path:
+        load_hook(hook_file_path)(context or HookContext(None, args))
 
 
 def get_configuration():
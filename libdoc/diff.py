@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Diff
+~~~~
+
+Compare two contents of a library, e.g. of two consecutive versions.
+
+The data types, interfaces, global objects and POUs, their methods, properties, actions and transitions
+and all their variables and members are matched by their qualified name (e.g. ``FB_Axis.Move.Velocity``).
+Every object gets a digest of its own attributes, of its variables and members and of its whole subtree.
+Subtrees with equal digests are not compared any further and the single variables and members are hashed
+only inside changed objects, so the time grows linearly with the size of the library.
+
+The :class:`Difference` lists the added, removed and changed elements and the ProjectStructure objects
+whose frame and code files are affected (see the parameter ``only`` of :func:`~libdoc.generate.generate`).
+"""
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import time
+
+from . import core
+from .content import load_content
+from .exceptions import ContentError
+
+AREAS = ("DataTypes", "Interfaces", "GlobalObjects", "POUs")  #: The areas of the top level objects
+SUB_AREAS = ("Methods", "Properties", "Actions", "Transitions", "Accessors")  #: The areas of the child objects
+MEMBER_AREAS = ("Variables", "Members")  #: The lists of the variables and members of an object
+
+_ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+class Node(object):
+    """
+    An element of a content with the digests of its own attributes, of its variables and members
+    and of its whole subtree. The variables and members become nodes only on demand (see :meth:`elements`),
+    because most of them are inside unchanged objects.
+
+    :param path: The path segments of the element, e.g. ``('POUs', 'FB_Axis', 'Methods', 'Move')``.
+    :param name: The qualified name of the element, e.g. ``FB_Axis.Move``.
+    """
+    __slots__ = ('path', 'name', 'own', 'members', 'tree', 'children', '_members')
+
+    def __init__(self, path, name, own, members=None, tree=None, children=None, member_lists=None):
+        self.path = path
+        self.name = name
+        self.own = own
+        self.members = members
+        self.tree = tree or own
+        self.children = children or {}
+        self._members = member_lists
+
+    @property
+    def area(self):
+        return self.path[-2] if self.path else None
+
+    @property
+    def object(self):
+        """
+        The path segments of the ProjectStructure object of the element (the owner of a variable or member).
+        """
+        for index in range(0, len(self.path), 2):
+            if self.path[index] in MEMBER_AREAS:
+                return self.path[:index]
+        return self.path
+
+    def elements(self, members=True):
+        """
+        :param members: Optional. Include the variables and members.
+        :return: The child objects (and the variables and members) by ``(area, name)``.
+        """
+        if not members or not self._members:
+            return self.children
+        elements = dict(self.children)
+        for area, member_list in self._members.items():
+            for member in member_list:
+                name = member.get("Name", '')
+                elements[area, name] = Node(self.path + (area, name), self.name + '.' + name,
+                                            _digest(_ENCODER.encode(member)))
+        return elements
+
+
+def _digest(*parts):
+    sha1 = hashlib.sha1()
+    for part in parts:
+        sha1.update(part.encode('utf-8'))
+        sha1.update(b'\0')
+    return sha1.hexdigest()
+
+
+def _node(path, name, element):
+    own = {}
+    member_lists = {}
+    children = {}
+    for key, value in element.items():
+        if key in SUB_AREAS and isinstance(value, dict):
+            for child_name, child in value.items():
+                # todo: remove this, after json is fixed
+                if child is not None:
+                    children[key, child_name] = _node(path + (key, child_name), name + '.' + child_name, child)
+        elif key in MEMBER_AREAS and isinstance(value, list):
+            own[key] = [member.get("Name", '') for member in value]  # a changed order changes the owner
+            member_lists[key] = value
+        else:
+            own[key] = value
+    own = _digest(_ENCODER.encode(own))
+    members = _digest(_ENCODER.encode(member_lists))  # all variables and members at once
+    tree = _digest(own, members, *('{0}.{1}:{2}'.format(area, child_name, children[area, child_name].tree)
+                                   for area, child_name in sorted(children)))
+    return Node(path, name, own, members, tree, children, member_lists)
+
+
+def content_tree(data):
+    """
+    :param data: The parsed content.
+    :return: The root :class:`Node` of the content with the top level objects as children.
+    """
+    children = {}
+    for area in AREAS:
+        for name, element in (data.get(area) or {}).items():
+            # todo: remove this, after json is fixed
+            if element is not None:
+                children[area, name] = _node((area, name), name, element)
+    tree = _digest('', *('{0}.{1}:{2}'.format(area, name, children[area, name].tree)
+                         for area, name in sorted(children)))
+    return Node((), '', '', tree=tree, children=children)
+
+
+class Difference(object):
+    """
+    The added, removed and changed elements (:class:`Node`) of two contents, sorted by their paths.
+    A changed element has changed attributes. An element with changed children only is not listed itself.
+    """
+
+    def __init__(self, added=(), removed=(), changed=()):
+        self.added = sorted(added, key=lambda node: node.path)
+        self.removed = sorted(removed, key=lambda node: node.path)
+        self.changed = sorted(changed, key=lambda node: node.path)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    @property
+    def objects(self):
+        """
+        The ProjectStructure objects (e.g. ``POUs.FB_Axis.Methods.Move``) whose documentation is affected:
+        the added and changed objects, the owners of the changed variables and members and all their parents.
+        """
+        objects = set()
+        for nodes, removed in ((self.added, False), (self.changed, False), (self.removed, True)):
+            for node in nodes:
+                path = node.object
+                if removed and path == node.path:
+                    path = path[:-2]  # the removed object itself has no documentation anymore
+                for index in range(2, len(path) + 1, 2):
+                    objects.add('.'.join(path[:index]))
+        return objects
+
+    def as_dict(self):
+        """
+        :return: The difference as JSON serializable dict.
+        """
+        def elements(nodes):
+            return [{'name': node.name, 'area': node.area, 'object': '.'.join(node.path)} for node in nodes]
+
+        return {'added': elements(self.added), 'removed': elements(self.removed),
+                'changed': elements(self.changed), 'objects': sorted(self.objects)}
+
+
+def compare(old, new):
+    """
+    Compare the parsed contents ``old`` and ``new``.
+
+    :return: The :class:`Difference`.
+    """
+    added, removed, changed = [], [], []
+    pending = [(content_tree(old), content_tree(new))]
+    while pending:
+        before, after = pending.pop()
+        members = before.members != after.members
+        old_elements, new_elements = before.elements(members), after.elements(members)
+        for key, node in new_elements.items():
+            previous = old_elements.get(key)
+            if previous is None:
+                added.append(node)
+            elif previous.tree != node.tree:
+                if previous.own != node.own:
+                    changed.append(node)
+                if previous.members is not None:
+                    pending.append((previous, node))
+        removed.extend(node for key, node in old_elements.items() if key not in new_elements)
+    return Difference(added, removed, changed)
+
+
+def diff(old_content=None, new_content=None, output=None):
+    """
+    Compare the contents <old_content> and <new_content> and print the added (+), removed (-)
+    and changed (~) elements.
+
+    :param output: Optional. A JSON file for the result.
+    :return: 0
+    """
+    for content in (old_content, new_content):
+        if content is None or not os.path.isfile(content) or not fnmatch.fnmatch(content, core.EXT_JSON):
+            raise ContentError('Not able to find the content file: {0}'.format(content))
+    start = time.time()
+    difference = compare(load_content(old_content), load_content(new_content))
+    print('Diff:', old_content, '->', new_content)
+    for mark, nodes in (('+', difference.added), ('-', difference.removed), ('~', difference.changed)):
+        for node in nodes:
+            print('    {0} {1} ({2})'.format(mark, node.name, node.area))
+    if output is not None:
+        with io.open(output, 'w', encoding='utf-8') as f:
+            json.dump(difference.as_dict(), f, indent=4, ensure_ascii=False)
+        print('Diff:', output)
+    print('{0} added, {1} removed, {2} changed ({3:.2f} s)'.format(
+        len(difference.added), len(difference.removed), len(difference.changed), time.time() - start))
+    return 0
@@ -53,4 +53,12 @@ class JobListError(LibDocError):
 
 
 class LocalisationError(LibDocError):
-    pass
\ No newline at end of file
+    pass
+
+
+class ServeError(LibDocError):
+    pass
+
+
+class TraceError(LibDocError):
+    pass
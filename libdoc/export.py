@@ -9,21 +9,267 @@ This module provides functionality for exporting the content out of a CODESYS li
 import sys
 import os
 import re
+import json
+import shlex
+import shutil
+import hashlib
 import subprocess
 import fnmatch
+import tempfile
+import time
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from . import core
+from . import core, trace
+from .stage import file_digest
 from .exceptions import CodesysError, LibraryError, ContentError, LibDocError
 
 
-def export(library=None, content=None, root=None, filter=None):
+@trace.traced('export')
+def export(library=None, content=None, root=None, filter=None, force=False):
     """
         | If ``config.json`` in ``Bin`` folder exist, it is used to find the host application.
         | Otherwise, the environment variable ``os.environ['LIBDOC_CODESYS']`` is used.
         | If variable not set, we try to find the latest CODESYS Version and use it for the export.
         | If library is None, we try to use the first library file in the current working directory
         | If content is None, we try to set it to ``./<library>.json``
+        | The content of a library which was already exported with the same host application is taken
+          from the export cache (see :func:`cache_key`). The option ``force`` bypasses the cache.
+    """
+    host = get_host(root, filter)
+
+    if library is None:
+        files = fnmatch.filter(os.listdir('.'), core.EXT_LIBRARY)
+        if files:
+            library = files[0]
+    if library is None or not os.path.isfile(library) or not fnmatch.fnmatch(library, core.EXT_LIBRARY):
+        raise LibraryError('Not able to find a library file')
+    library = os.path.abspath(library)
+
+    content = _content_path(library, content)
+
+    content_file = content
+    cache_file = _cache_file(library, host)
+    if not force and os.path.isfile(cache_file):
+        shutil.copyfile(cache_file, content_file)
+        print("Export <lib> to <content> from the export cache")
+        print("<lib> =", library)
+        print("<content> =", content)
+        print("<cache> =", cache_file)
+        print("Result:", 0, "-- Done!")
+        return 0
+
+    if os.path.isfile(content_file):
+        os.remove(content_file)  # a stale content file would hide a failed export
+    cmd = _command(host, library, content_file)
+    print("Export <lib> to <content> using <codesys>")
+    print("<lib> =", library)
+    print("<content> =", content)
+    print("<codesys> =", host)
+    print("calling:", cmd)
+    print("...")
+    sys.stdout.flush()
+    code = subprocess.call(split_command(cmd), stdout=sys.stdout, stderr=sys.stdout)
+    sys.stdout.flush()
+    msg = "-- Done!"
+    if code != 2 and not os.path.isfile(content_file):
+        code = 1  # no JSON file created !
+        msg = "-- Error!"
+    elif code == 2:
+        msg = "-- The library is already in use, please close the other CODESYS instances!"
+    if code == 0:
+        _store(content_file, cache_file)
+    print("Result:", code, msg)
+    return code
+
+
+ExportResult = namedtuple('ExportResult', ['library', 'content', 'code', 'message', 'attempts', 'elapsed', 'log'])
+"""
+    The result of a single export of :func:`export_all`
+"""
+
+
+def export_all(libraries, contents=None, jobs=None, retries=3, backoff=10.0, timeout=None, force=False,
+               root=None, filter=None):
+    """
+    Export several libraries with concurrent CODESYS processes.
+
+    | Every process runs in its own temporary working folder, which is also its ``TMP`` folder.
+    | The output of every process is written to ``<content>.export.log``.
+    | An export which ends with code 2 (library in use) is retried after ``backoff``, ``2 * backoff``, ... seconds.
+    | An export which runs longer than ``timeout`` seconds is killed.
+    | The export cache is used like in :func:`export`.
+
+    :param libraries: The library files.
+    :param contents: Optional. The content files, defaults to ``<library>.json`` next to each library.
+    :param jobs: Optional. The number of concurrent exports. Defaults to half the number of CPUs.
+    :param retries: Optional. The number of retries if the library is in use.
+    :param backoff: Optional. The delay in seconds before the first retry.
+    :param timeout: Optional. The time limit of a single export in seconds.
+    :param force: Optional. Bypass the export cache.
+    :return: A list of :class:`ExportResult` in the order of ``libraries``
+    """
+    host = get_host(root, filter)
+    libraries = [os.path.abspath(library) for library in libraries]
+    contents = [_content_path(library, content) for library, content in zip(libraries, contents or [None] * len(libraries))]
+    jobs = jobs or max(1, (os.cpu_count() or 2) // 2)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_export_job, host, library, content, retries, backoff, timeout, force)
+                   for library, content in zip(libraries, contents)]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result.library] = result
+            print("Export:", os.path.basename(result.library), result.code, result.message,
+                  "({0:.1f} s, {1} attempts)".format(result.elapsed, result.attempts))
+    return [results[library] for library in libraries]
+
+
+def _export_job(host, library, content, retries, backoff, timeout, force):
+    start = time.time()
+    log_file = '{0}{1}'.format(os.path.splitext(content)[0], core.EXPORT_LOG_SUFFIX)
+    try:
+        return _export_library(host, library, content, retries, backoff, timeout, force, log_file)
+    except Exception as ex:  # e.g. an unreadable library, one failing export must not stop the others
+        return ExportResult(library, content, 1, '{0}: {1}'.format(type(ex).__name__, ex), 0,
+                            time.time() - start, log_file)
+
+
+def _export_library(host, library, content, retries, backoff, timeout, force, log_file):
+    start = time.time()
+    cache_file = _cache_file(library, host)
+    with open(log_file, 'w', encoding='utf-8') as log:
+        log.write("<lib> = {0}\n<content> = {1}\n<codesys> = {2}\n".format(library, content, host))
+        if not force and os.path.isfile(cache_file):
+            shutil.copyfile(cache_file, content)
+            log.write("<cache> = {0}\n".format(cache_file))
+            return ExportResult(library, content, 0, "-- Done!", 0, time.time() - start, log_file)
+
+    if os.path.isfile(content):
+        os.remove(content)  # a stale content file would hide a failed export
+    cmd = _command(host, library, content)
+    code = attempt = 0
+    for attempt in range(1, retries + 2):
+        code = _run(cmd, log_file, timeout)
+        if code != 2 or attempt > retries:
+            break
+        delay = backoff * 2 ** (attempt - 1)
+        with open(log_file, 'a', encoding='utf-8') as log:
+            log.write("-- The library is already in use, retry in {0:.1f} s\n".format(delay))
+        time.sleep(delay)
+
+    msg = "-- Done!"
+    if code is None:
+        code = 1
+        msg = "-- Timeout after {0} s!".format(timeout)
+    elif code == 2:
+        msg = "-- The library is already in use, please close the other CODESYS instances!"
+    elif not os.path.isfile(content):
+        code = 1  # no JSON file created !
+        msg = "-- Error!"
+    if code == 0:
+        _store(content, cache_file)
+    with open(log_file, 'a', encoding='utf-8') as log:
+        log.write("Result: {0} {1}\n".format(code, msg))
+    return ExportResult(library, content, code, msg, attempt, time.time() - start, log_file)
+
+
+def _run(cmd, log_file, timeout):
+    """
+    Run ``cmd`` inside a temporary working folder and append its output to ``log_file``.
+
+    :return: The exit code or ``None`` if the process was killed after ``timeout`` seconds
+    """
+    work = tempfile.mkdtemp(prefix='libdoc-export-')
+    try:
+        with open(log_file, 'a', encoding='utf-8') as log:
+            env = dict(os.environ, TMP=work, TEMP=work, TMPDIR=work)
+            log.write("calling: {0}\n".format(cmd))
+            log.flush()
+            process = subprocess.Popen(split_command(cmd), cwd=work, env=env, stdout=log, stderr=subprocess.STDOUT)
+            try:
+                return process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+                return None
+    finally:
+        # a killed CODESYS can leave locked files behind (Windows)
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def _content_path(library, content=None):
+    if content is None:
+        name = '{0}{1}'.format(os.path.splitext(os.path.basename(library))[0], os.path.splitext(core.EXT_JSON)[1])
+        content = os.path.join(os.path.dirname(library), name)
+    content = os.path.abspath(content)
+    if not fnmatch.fnmatch(content, core.EXT_JSON):
+        raise ContentError('Not able to create a content file')
+    return content
+
+
+def _command(host, library, content):
+    return '{exe} --noUI --skipunlicensedplugins --docexport="{lib}|{cnt}"'.format(exe=host, lib=library, cnt=content)
+
+
+def _cache_file(library, host):
+    return os.path.join(get_cache_dir(), '{0}{1}'.format(cache_key(library, host), os.path.splitext(core.EXT_JSON)[1]))
+
+
+def split_command(cmd):
+    """
+    :return: The command line ``cmd`` as it is passed to :class:`subprocess.Popen`.
+             Windows parses the string itself, elsewhere the arguments are split like a POSIX shell does.
+    """
+    return cmd if os.name == 'nt' else shlex.split(cmd)
+
+
+def get_cache_dir():
+    """
+    :return: The folder of the export cache (``LIBDOC_CACHE`` or ``~/.libdoc/cache``)
+    """
+    return os.path.join(os.environ.get(core.LIBDOC_CACHE) or os.path.join(os.path.expanduser('~'), *core.CACHE_PATH),
+                        'export')
+
+
+def cache_key(library, host):
+    """
+    The key of an export in the export cache.
+    It covers the library content, the host command line (including the profile)
+    and the size and modification time of the host executable, which change with every CODESYS update.
+
+    :return: A hex digest
+    """
+    args = shlex.split(host, posix=os.name != 'nt')
+    exe = args[0].strip('"') if args else ''
+    exe = exe if os.path.isfile(exe) else shutil.which(exe) or exe
+    try:
+        stat = os.stat(exe)
+        exe_stat = [stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        exe_stat = None
+    key = {'library': file_digest(library), 'host': host, 'exe': exe_stat}
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _store(content_file, cache_file):
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+        shutil.copyfile(content_file, tmp_file)
+        os.replace(tmp_file, cache_file)
+    except OSError as ex:
+        print("Not able to update the export cache:", ex)
+
+
+def get_host(root=None, filter=None):
+    """
+    Find the command line of the host application with the LibDoc plug-in.
+
+    :param str root: The path for program files (see :func:`get_latest_codesys`)
+    :param str filter: The pattern for CODESYS folder inside the program folder (see :func:`get_latest_codesys`)
+    :return: The command line of the host application
     """
     host = None
 
@@ -56,40 +302,8 @@ def export(library=None, content=None, root=None, filter=None):
             raise CodesysError('Not able to find a CODESYS.EXE')
         host = '"{codesys.exe}" --Profile="{codesys.profile}"'.format(codesys=latest_codesys)
 
-    if library is None:
-        files = fnmatch.filter(os.listdir('.'), core.EXT_LIBRARY)
-        if files:
-            library = files[0]
-    if library is None or not os.path.isfile(library) or not fnmatch.fnmatch(library, core.EXT_LIBRARY):
-        raise LibraryError('Not able to find a library file')
-    library = os.path.abspath(library)
+    return host
 
-    if content is None:
-        name = '{0}{1}'.format(os.path.splitext(os.path.basename(library))[0], os.path.splitext(core.EXT_JSON)[1])
-        content = os.path.join(os.path.dirname(library), name)
-    content = os.path.abspath(content)
-    if not fnmatch.fnmatch(content, core.EXT_JSON):
-        raise ContentError('Not able to create a content file')
-
-    content_file = content
-    cmd = '{exe} --noUI --skipunlicensedplugins --docexport="{lib}|{cnt}"'.format(exe=host, lib=library, cnt=content_file)
-    print("Export <lib> to <content> using <codesys>")
-    print("<lib> =", library)
-    print("<content> =", content)
-    print("<codesys> =", host)
-    print("calling:", cmd)
-    print("...")
-    sys.stdout.flush()
-    code = subprocess.call(cmd, stdout=sys.stdout, stderr=sys.stdout)
-    sys.stdout.flush()
-    msg = "-- Done!"
-    if code != 2 and not os.path.isfile(content_file):
-        code = 1  # no JSON file created !
-        msg = "-- Error!"
-    elif code == 2:
-        msg = "-- The library is already in use, please close the other CODESYS instances!"
-    print("Result:", code, msg)
-    return code
 
 Codesys = namedtuple('Codesys', ['version', 'exe', 'profile'])
 """
@@ -13,33 +13,57 @@ import shutil
 from datetime import datetime
 import io
 
-from jinja2 import Environment, FileSystemLoader
-
-from . import core
+from . import core, trace
 from .exceptions import ContentError, FrameError
-from .content import Content, Configuration
+from .content import Content, Configuration, load_content
 from .mergecache import create_merge_cache
 
 
-def generate(content=None, frame=None, force=False, backup=False, condensed=False, slug=0):
+def _create(file_name, opener=io.open):
+    """
+    Open the generated file ``file_name`` for writing, announce it and count it for the trace.
+    """
+    f = opener(file_name, 'w', encoding='utf-8')
+    print('Generate:', file_name)
+    trace.count('files')
+    return f
+
+
+@trace.traced('generate')
+def generate(content=None, frame=None, force=False, backup=False, condensed=False, slug=0, data=None,
+             only=None, since=None):
     """
     | Try to find and load the content file in JSON format
     | Try to find or create the Frame folder
     | Generate a folder and file structure matching the ProjectStructure inside the content file
+
+    :param data: Optional. The already loaded content, e.g. the cleaned content of ``libdoc make``.
+                 ``content`` is then only the location of the content and does not have to exist.
+    :param only: Optional. The ProjectStructure objects (e.g. ``POUs.FB_Axis``) whose frame and code files
+                 are generated (see :attr:`libdoc.diff.Difference.objects`). All other objects are skipped.
+    :param since: Optional. An older content file. Only the objects which differ from it are generated.
     """
 
     if content is None:
-        files = fnmatch.filter(os.listdir('.'), core.EXT_JSON)
+        files = [f for f in fnmatch.filter(os.listdir('.'), core.EXT_JSON)
+                 if not fnmatch.fnmatch(f, core.EXT_SYMBOLS_JSON)]
         if files:
             content = files[0]
-    if content is None or not os.path.isfile(content) or not fnmatch.fnmatch(content, core.EXT_JSON):
+    if content is None or not fnmatch.fnmatch(content, core.EXT_JSON) or (data is None and not os.path.isfile(content)):
         raise ContentError('Not able to find the content file')
     content = os.path.abspath(content)
     config_path = os.path.dirname(content)
 
-    content = Content(content, condensed=condensed, slug=slug)
+    content = Content(content, condensed=condensed, slug=slug, data=data)
     content_info = content.info
 
+    if since is not None:
+        if not os.path.isfile(since):
+            raise ContentError('Not able to find the content file: {0}'.format(since))
+        from .diff import compare
+        only = set(only or ()) | compare(load_content(since), content.data).objects
+        print('Generate:', len(only), 'changed objects since', since)
+
     if frame is None:
         frame = os.path.join(config_path, core.FRAME)
 
@@ -54,14 +78,8 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
 
     code = os.path.join(config_path, core.CODE)
 
-    locations = os.environ.get(core.LIBDOC_TEMPLATES, "").split(';')
-    locations = [l for l in locations if os.path.isdir(l)]
     basedir = core.get_base_dir()
-
-    locations.append(os.path.join(os.path.abspath(basedir), core.TEMPLATES))
-    env = Environment(loader=FileSystemLoader(locations), trim_blocks=True, lstrip_blocks=True)
-    env.filters['se'] = core.escape_iec_names
-    env.filters['fe'] = core.escape_folder_names
+    env = core.template_environment()
 
     theme_template = os.environ.get(core.LIBDOC_THEME, os.path.join(os.path.abspath(basedir), 'themes'))
     theme_dir = os.path.join(config_path, core.THEME)
@@ -76,8 +94,7 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
         particle_file_name = os.path.join(config_path, template_name)
         # the files in sphinx_templates should never overwritten!
         if not os.path.isfile(particle_file_name):
-            with io.open(particle_file_name, 'w', encoding='utf-8') as f:
-                print('Generate:', particle_file_name)
+            with _create(particle_file_name) as f:
                 now = datetime.now().replace(microsecond=0).isoformat(sep=' ')
                 ctx = {'content': content, 'name': os.path.splitext(content_info["FileHeader.libraryFile"])[0],
                        'frame': os.path.basename(frame), 'creationDateTime': now, 'build': core.BUILD}
@@ -104,8 +121,7 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
                 except OSError:
                     os.remove(bak_file)
                     os.rename(file_name, bak_file)
-            with io.open(file_name, 'w', encoding='utf-8') as f:
-                print('Generate:', file_name)
+            with _create(file_name) as f:
                 ctx = {'content': content}
                 f.write(template.render(ctx))
                 f.write('\n')
@@ -143,6 +159,9 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
                     except OSError:
                         pass
 
+        if only is not None and particle.object is not None and particle.object not in only:
+            continue
+
         particle_list = [particle]
         #if particle_type not in ("Index", "Folder"):
         #    particle_list.extend(list(particle.inherited_particles.itervalues()))
@@ -156,8 +175,7 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
                     except OSError:
                         os.remove(bak_file)
                         os.rename(particle_file_name, bak_file)
-                with io.open(particle_file_name, 'w', encoding='utf-8') as f:
-                    print('Generate:', particle_file_name)
+                with _create(particle_file_name) as f:
                     template = env.get_template(core.TEMPLATE_NAMES[current_particle.type])
                     ctx = {'content': content, 'key': current_particle.key}
                     f.write(template.render(ctx))
@@ -193,8 +211,7 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
                         except OSError:
                             os.remove(bak_file)
                             os.rename(particle_file_name, bak_file)
-                    with io.open(particle_file_name, 'w', encoding='utf-8') as f:
-                        print('Generate:', particle_file_name)
+                    with _create(particle_file_name) as f:
                         template = env.get_template('kin_header.rst')
                         ctx = {'content': content, 'particle': current_particle}
                         f.write(template.render(ctx))
@@ -202,8 +219,7 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
                 image = os.path.splitext(os.path.basename(particle_file_name))[0] + '.svg'
                 particle_file_name = os.path.join(os.path.dirname(particle_file_name), image)
                 kinematic_image = os.path.join('_images', image).replace('\\', '/')
-                with io.open(particle_file_name, 'w', encoding='utf-8') as f:
-                    print('Generate:', particle_file_name)
+                with _create(particle_file_name) as f:
                     template = env.get_template('kin_img.svg')
                     ctx = {'content': content, 'particle': current_particle}
                     f.write(template.render(ctx))
@@ -223,8 +239,7 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
                             except OSError:
                                 os.remove(bak_file)
                                 os.rename(param_file_name, bak_file)
-                        with io.open(param_file_name, 'w', encoding='utf-8') as f:
-                            print('Generate:', param_file_name)
+                        with _create(param_file_name) as f:
                             template = env.get_template('kin_param.rst')
                             ctx = {'content': content, 'particle': current_particle, 'param': param}
                             f.write(template.render(ctx))
@@ -232,8 +247,7 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
                     image = os.path.splitext(os.path.basename(param_file_name))[0] + '.svg'
                     param_file_name = os.path.join(os.path.dirname(param_file_name), image)
                     kinematic_image = os.path.join('_images', image).replace('\\', '/')
-                    with io.open(param_file_name, 'w', encoding='utf-8') as f:
-                        print('Generate:', param_file_name)
+                    with _create(param_file_name) as f:
                         template = env.get_template('kin_img.svg')
                         ctx = {'content': content, 'particle': current_particle, 'param': param}
                         f.write(template.render(ctx))
@@ -251,8 +265,7 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
                         except OSError:
                             os.remove(bak_file)
                             os.rename(kinematic_file_name, bak_file)
-                    with io.open(kinematic_file_name, 'w', encoding='utf-8') as f:
-                        print('Generate:', kinematic_file_name)
+                    with _create(kinematic_file_name) as f:
                         template = env.get_template('kinematic.rst')
                         ctx = {'content': content, 'particle': current_particle,
                                'images': current_particle.kinematic_images}
@@ -270,13 +283,17 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
                     os.makedirs(os.path.dirname(file_name))
                 except OSError:
                     pass
-                with io.open(file_name, 'w', encoding='utf-8') as f:
-                    print('Generate:', file_name)
+                with _create(file_name) as f:
                     f.write(txt)
 
+    # the symbol table of the symbol index (see libdoc.transform.write_symbols)
+    symbols_file_name = os.path.join(frame, core.SYMBOLS_JSON)
+    with _create(symbols_file_name, codecs.open) as f:
+        json.dump({'symbols': {key: content.symbols[key] for key in content.symbols}}, f,
+                  sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
     frame_file_name = os.path.join(frame, core.FRAME_JSON)
     if not os.path.isfile(frame_file_name) or force:
-        print('Generate:', frame_file_name)
         manifest = {'header': {'name': core.FRAME_JSON,
                                'version': '0.0.0.5',
                                'created': datetime.utcnow().replace(microsecond=0).isoformat(),
@@ -290,7 +307,18 @@ def generate(content=None, frame=None, force=False, backup=False, condensed=Fals
             manifest.update({'mapping': mapping})
         if kinematics is not None:
             manifest.update({'extensions': {'kinematics': kinematics}})
-        with codecs.open(frame_file_name, 'w', encoding='utf-8') as f:
+        # an unchanged manifest keeps its creation time, so the frame stays byte-identical
+        # and libdoc make can skip the transformation
+        try:
+            with codecs.open(frame_file_name, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+            if isinstance(previous, dict) and isinstance(previous.get('header'), dict):
+                created = previous['header'].get('created')
+                if dict(manifest, header=dict(manifest['header'], created=created)) == previous:
+                    manifest['header']['created'] = created
+        except (IOError, ValueError):
+            pass
+        with _create(frame_file_name, codecs.open) as f:
             json.dump(manifest, f, indent=4, separators=(',', ': '), sort_keys=True, ensure_ascii=False)
 
     return 0
@@ -20,45 +20,43 @@ import json
 import os
 import shutil
 
-from translate.convert import convert
-from translate.storage import po
-from translate.convert.po2xliff import po2xliff
-from translate.convert.xliff2po import convertxliff
-from translate.tools.pocompile import convertmo
-
 from . import core
-from .export import export
-from .clean import clean
-from .generate import generate
-from .transform import transform
-from .exceptions import MakeError, BuilderError
+from .export import export, get_host
+from .clean import clean_data, dump
+from .stage import BuildGraph, Stage, file_digest, tree_digest
+from .exceptions import MakeError, BuilderError, LibDocError
 
 
 INPUT_EXT = ['library', 'json']
 OUTPUT_EXT = ['json', 'html', 'chm', 'lmd']
+HOOKS = ('BeforeExport', 'AfterExport', 'BeforeClean', 'AfterClean',
+         'BeforeGenerate', 'AfterGenerate', 'BeforeTransform', 'AfterTransform')  #: The hook points of make
 TRANSITIONS = {
     ('library', 'html'), ('library', 'chm'), ('library', 'lmd'),
     ('json', 'html'), ('json', 'chm'), ('json', 'lmd'),
 }
 
 
-def _export(library, json=None):
+def _export(library, json=None, force=False):
     if json is None:
         name = '{0}{1}'.format(os.path.splitext(os.path.basename(library))[0], os.path.splitext(core.EXT_JSON)[1])
         json = os.path.join(os.path.dirname(library), name)
-    export(library, json)
+    export(library, json, force=force)
     return json if os.path.isfile(json) else None
 
 
 def _clean(content, clean_content=None):
-    if clean_content is None:
-        name = "{content[0]}.clean{content[1]}".format(content=os.path.splitext(content))
-        clean_content = os.path.join(os.path.dirname(content), name)
-    clean(content, clean_content)
-    return clean_content if os.path.isfile(clean_content) else None
+    """
+    :return: The cleaned content. It is written to ``clean_content`` only if a path is given.
+    """
+    data = clean_data(content)
+    if clean_content is not None:
+        dump(data, clean_content)
+    return data
 
 
-def _generate(content, frame=None, condensed=True):
+def _generate(content, frame=None, condensed=True, data=None):
+    from .generate import generate
     if frame is None:
         config_path = os.path.dirname(content)
         frame = os.path.join(config_path, core.FRAME)
@@ -69,11 +67,12 @@ def _generate(content, frame=None, condensed=True):
                 os.remove(old)
             if os.path.isdir(old):
                 shutil.rmtree(old)
-    generate(content, frame, force=True, condensed=condensed, slug=16)
+    generate(content, frame, force=True, condensed=condensed, slug=16, data=data)
     return frame if os.path.isfile(os.path.join(frame, core.FRAME_JSON)) else None
 
 
 def _transform(builder, frame, product=None):
+    from .transform import transform
     config_path = os.path.normpath(os.path.join(frame, os.path.pardir))
     build_path = os.path.join(config_path, core.BUILD, os.path.basename(frame))
     if builder == 'chm':
@@ -103,6 +102,8 @@ def _transform(builder, frame, product=None):
         pass
 
     transform(builder, frame)
+    if not os.path.exists(result):
+        return None
     if product != result:
         if builder in ['chm', 'lmd']:
             if os.path.isfile(product):
@@ -111,6 +112,12 @@ def _transform(builder, frame, product=None):
                 except OSError:
                     return None
             shutil.copyfile(result, product)
+            if builder == 'lmd':
+                # the symbol index ships next to the lmd file
+                index = os.path.join(os.path.dirname(result), core.EXT_SYMBOLS_JSON.replace(
+                    '*', os.path.splitext(os.path.basename(result))[0]))
+                if os.path.isfile(index):
+                    shutil.copyfile(index, core.EXT_SYMBOLS_JSON.replace('*', os.path.splitext(product)[0]))
         elif builder == 'html':
             src = os.path.dirname(result)
             dst = product
@@ -130,6 +137,8 @@ def _transform(builder, frame, product=None):
 
 def convertpo(inputfile, outputfile, templatefile):
     """reads in stdin using fromfileclass, converts using convertorclass, writes to stdout"""
+    from translate.storage import po
+    from translate.convert.po2xliff import po2xliff
     inputstore = po.pofile(inputfile)
     if inputstore.isempty():
         return 0
@@ -143,6 +152,7 @@ def convertpo(inputfile, outputfile, templatefile):
 
 
 def _po2xliff(locale, xliff=None):
+    from translate.convert import convert
     formats = {"po": ("xlf", convertpo)}
     parser = convert.ConvertOptionParser(
         formats,
@@ -154,6 +164,8 @@ def _po2xliff(locale, xliff=None):
 
 
 def _xliff2po(xliff, locale=None):
+    from translate.convert import convert
+    from translate.convert.xliff2po import convertxliff
     formats = {"xlf": ("po", convertxliff)}
     parser = convert.ConvertOptionParser(
         formats,
@@ -166,6 +178,8 @@ def _xliff2po(xliff, locale=None):
 
 
 def _pocompile(locale):
+    from translate.convert import convert
+    from translate.tools.pocompile import convertmo
     formats = {"po": ("mo", convertmo)}
     parser = convert.ConvertOptionParser(
         formats,
@@ -177,7 +191,22 @@ def _pocompile(locale):
     return 0
 
 
-def make(inp=None, out=None, condensed=True):
+def make(inp=None, *outputs, condensed=True, force=False, explain=False, keep=False):
+    """
+    Generate one or several <output> targets from the <input>.
+
+    The pipeline export -> clean -> generate -> transform runs as a :class:`~libdoc.stage.BuildGraph`.
+    All targets share the export, clean and generate stages, every target has its own transform stage.
+    A stage is skipped as long as its inputs are unchanged since its last successful run.
+    The cleaned content is handed over to generate in memory, the ``*.clean.json`` file is only written
+    on request or if a hook expects it.
+
+    :param force: Optional. Run all stages regardless of their previous runs.
+    :param explain: Optional. Print why each stage runs or is skipped.
+    :param keep: Optional. Keep the ``*.clean.json`` file for inspection.
+    :return: 0 if all targets were generated successfully, otherwise 1
+    """
+    out = outputs[0] if outputs else None
     if inp is None:
         files = fnmatch.filter(os.listdir('.'), core.EXT_LIBRARY)
         if files:
@@ -227,66 +256,140 @@ def make(inp=None, out=None, condensed=True):
         raise MakeError('Not able to handle file format: *.{ext}'.format(ext=exti))
     inp = os.path.abspath(inp)
 
-    if out is None:
-        out = "{0}.{1}".format(os.path.splitext(os.path.basename(inp))[0], 'chm')
-    name, exto = os.path.splitext(out)
-    exto = exto[1:]
-    if not exto:
-        exto = os.path.basename(name)
-
-    if exto not in OUTPUT_EXT:
-        raise MakeError('Not able to handle file format: *.{ext}'.format(ext=exto))
-    out = os.path.abspath(out)
-
-    if (exti, exto) not in TRANSITIONS:
-        raise MakeError('Not able to handle the transition from *.{exti} to *.{exto}'.format(exti=exti, exto=exto))
-
-    if exto == 'html':
-        out = os.path.join(os.path.dirname(out), "{0}-html".format(out_name))
-
-    _before_export = _after_export = None
-    _before_clean = _after_clean = None
-    _before_generate = _after_generate = None
-    _before_transform = _after_transform = None
-
+    if not outputs:
+        outputs = ["{0}.{1}".format(os.path.splitext(os.path.basename(inp))[0], 'chm')]
+    targets = []
+    for out in outputs:
+        name, exto = os.path.splitext(out)
+        exto = exto[1:]
+        if not exto:
+            exto = os.path.basename(name)
+
+        if exto not in OUTPUT_EXT:
+            raise MakeError('Not able to handle file format: *.{ext}'.format(ext=exto))
+        out = os.path.abspath(out)
+
+        if (exti, exto) not in TRANSITIONS:
+            raise MakeError('Not able to handle the transition from *.{exti} to *.{exto}'.format(exti=exti, exto=exto))
+
+        if exto == 'html':
+            out = os.path.join(os.path.dirname(out), "{0}-html".format(out_name))
+        if any(exto == target[0] for target in targets):
+            raise MakeError('The *.{ext} format is requested more than once'.format(ext=exto))
+        targets.append((exto, out))
+
+    hooks = {}
     conf = core.get_configuration()
     if conf and "Hooks" in conf:
-        hooks = conf["Hooks"]
-        _before_export = get_hook(hooks, "BeforeExport")
-        _after_export = get_hook(hooks, "AfterExport")
-        _before_clean = get_hook(hooks, "BeforeClean")
-        _after_clean = get_hook(hooks, "AfterClean")
-        _before_generate = get_hook(hooks, "BeforeGenerate")
-        _after_generate = get_hook(hooks, "AfterGenerate")
-        _before_transform = get_hook(hooks, "BeforeTransform")
-        _after_transform = get_hook(hooks, "AfterTransform")
+        for key in HOOKS:
+            hook = get_hook(conf["Hooks"], key)
+            if hook is not None:
+                hooks[key] = hook
 
     if exti == 'library':
-        core.exec_hook(_before_export, [inp])
-        content = _export(inp)
-        inp = content
-        core.exec_hook(_after_export, [content])
-
-    core.exec_hook(_before_clean, [inp])
-    content = _clean(inp)
-    core.exec_hook(_after_clean, [content])
-
-    core.exec_hook(_before_generate, [content, condensed])
-    frame = _generate(content, condensed=condensed)
-    core.exec_hook(_after_generate, [frame])
-
-    core.exec_hook(_before_transform, [exto, frame, out])
-    product = _transform(exto, frame, out)
-    core.exec_hook(_after_transform, [product])
-
-    return 1 if product is None else 0
+        content = os.path.join(os.path.dirname(inp), '{0}{1}'.format(
+            os.path.splitext(os.path.basename(inp))[0], os.path.splitext(core.EXT_JSON)[1]))
+    else:
+        content = inp
+    clean_content = os.path.join(os.path.dirname(content), "{0[0]}.clean{0[1]}".format(
+        os.path.splitext(os.path.basename(content))))
+    config_path = os.path.dirname(content)
+    frame = os.path.join(config_path, core.FRAME)
+
+    def run_hook(key, *args, **values):
+        context = core.HookContext(key, args, input=inp, content_file=content, clean_content_file=clean_content,
+                                   condensed=condensed, frame=frame, **values)
+        if key in hooks:
+            hooks[key](context)
+            if hooks[key].legacy:
+                context.data = None  # a classic hook changes the *.clean.json file, generate reads it again
+        return context
+
+    def export_stage():
+        run_hook('BeforeExport', inp)
+        result = _export(inp, content, force=force)
+        run_hook('AfterExport', result, result=result)
+        return result
+
+    # the classic hooks of the clean and generate stages work on the *.clean.json file,
+    # hooks with a run(context) function get the cleaned content in memory.
+    # After a classic hook the data in memory is dropped, so generate reads the file again.
+    keep = keep or any(key in hooks and hooks[key].legacy for key in ('AfterClean', 'BeforeGenerate'))
+    cleaned = {}
+
+    def clean_stage():
+        run_hook('BeforeClean', content)
+        cleaned['data'] = _clean(content, clean_content if keep else None)
+        cleaned['data'] = run_hook('AfterClean', clean_content, data=cleaned['data']).data
+        return clean_content if os.path.isfile(clean_content) else None
+
+    def generate_stage():
+        if not keep and 'data' not in cleaned:
+            clean_stage()  # the in-memory clean runs only if generate needs the data
+        data = run_hook('BeforeGenerate', clean_content, condensed, data=cleaned.pop('data', None)).data
+        # without cleaned data (the clean stage was up to date) the *.clean.json file is read
+        result = _generate(clean_content, frame, condensed=condensed, data=data)
+        run_hook('AfterGenerate', result, result=result)
+        return result
+
+    def transform_stage(exto, out):
+        def action():
+            run_hook('BeforeTransform', exto, frame, out, builder=exto, output=out)
+            result = _transform(exto, frame, out)
+            run_hook('AfterTransform', result, builder=exto, output=out, result=result)
+            return result
+        return action
+
+    graph = BuildGraph(os.path.join(config_path, core.MAKE_STATE_JSON), force=force, explain=explain)
+    if exti == 'library':
+        graph.add(Stage('export', export_stage, outputs=[content],
+                        inputs={'library': lambda: file_digest(inp), 'host': _host}))
+    clean_inputs = {'content': lambda: file_digest(content),
+                    'clean.conf': lambda: file_digest(os.path.join(config_path, 'clean.conf'))}
+    if keep:
+        graph.add(Stage('clean', clean_stage, outputs=[clean_content], inputs=clean_inputs))
+        generate_inputs = {'content': lambda: file_digest(clean_content)}
+    else:
+        generate_inputs = dict(clean_inputs)
+    generate_inputs.update({'condensed': condensed, 'templates': os.environ.get(core.LIBDOC_TEMPLATES)})
+    graph.add(Stage('generate', generate_stage, outputs=[os.path.join(frame, core.FRAME_JSON)],
+                    inputs=generate_inputs))
+    # The sphinx builders share the builder state and the conf.py inside <config_path>,
+    # so the format specific transforms have to run one after the other.
+    for exto, out in targets:
+        graph.add(Stage('transform:{0}'.format(exto), transform_stage(exto, out), outputs=[out], requires=['generate'],
+                        inputs={'builder': exto, 'product': out,
+                                # generate rewrites every frame file, only a changed content matters
+                                'frame': lambda: tree_digest(frame, content=True),
+                                'conf.py': lambda: file_digest(os.path.join(config_path, core.CONF)),
+                                'theme': lambda: tree_digest(os.path.join(config_path, core.THEME))}))
+    results = graph.run()
+
+    print('Result:')
+    code = 0
+    for exto, out in targets:
+        product = results.get('transform:{0}'.format(exto))
+        print('    {0:<5} {1} {2}'.format(exto, 0 if product else 1, product or '-'))
+        if product is None:
+            code = 1
+    return code
+
+
+def _host():
+    try:
+        return get_host()
+    except LibDocError:
+        return None
 
 
 def get_hook(hooks, key):
+    """
+    :return: The compiled hook script of the hook point ``key`` or ``None``.
+    """
     if key in hooks:
         target_file_path = hooks[key]
         if not os.path.isfile(target_file_path):
             raise MakeError('{0} hook target script file not found: {1}'.format(key, target_file_path))
-        return target_file_path
+        return core.load_hook(target_file_path)
     return None
 
@@ -6,6 +6,7 @@ Merge
 This module provide functionality for mering content and frame data
 """
 import codecs
+import functools
 import os
 import fnmatch
 import io
@@ -13,20 +14,20 @@ import json
 import re
 import shutil
 
-from jinja2 import Environment, FileSystemLoader
-
-from . import core
+from . import core, trace
 import sys
 from .exceptions import MergeError
 from .content import Content, Configuration
 
 
+@trace.traced('merge')
 def merge(content=None, frame=None, source=None, debug=False):
     """
     So we see what is merge
     """
     if content is None:
-        files = fnmatch.filter(os.listdir('.'), core.EXT_JSON)
+        files = [f for f in fnmatch.filter(os.listdir('.'), core.EXT_JSON)
+                 if not fnmatch.fnmatch(f, core.EXT_SYMBOLS_JSON)]
         if files:
             content = files[0]
     if content is None or not os.path.isfile(content) or not fnmatch.fnmatch(content, core.EXT_JSON):
@@ -47,57 +48,125 @@ def merge(content=None, frame=None, source=None, debug=False):
             raise MergeError('Not able to delete source: {source}'.format(source=source))
     os.mkdir(source)
 
-    content = Content(content)
+    merger = FrameMerge(content, frame, source, debug=debug)
+    merger.merge_conf()
+    merger.merge_all()
 
-    ext = os.path.splitext(core.EXT_JSON)[1]
-    merge_cache = os.path.join(frame, core.MERGE_CACHE)
-    cache_filename = os.path.join(merge_cache, "{name}{ext}".format(name=core.MERGE_CACHE, ext=ext))
-    with codecs.open(cache_filename, 'r', encoding='utf-8') as f:
-        cache = json.load(f)
 
-    locations = os.environ.get(core.LIBDOC_TEMPLATES, "").split(';')
-    locations = [l for l in locations if os.path.isdir(l)]
-    basedir = core.get_base_dir()
+class FrameMerge(object):
+    """
+    The merge of the <frame> structure into the <source> structure.
 
-    locations.append(os.path.join(os.path.abspath(basedir), core.TEMPLATES))
-    env = Environment(loader=FileSystemLoader(locations), trim_blocks=True, lstrip_blocks=True)
-    env.filters['se'] = core.escape_iec_names
-    env.filters['fe'] = core.escape_folder_names
+    :func:`merge` merges the whole frame, ``libdoc watch`` merges single files again
+    and writes only the files whose merged text changed.
 
-    # merge conf.py
-    config_path = os.path.normpath(os.path.join(frame, os.path.pardir))
-    config_file = os.path.join(config_path, core.CONF)
-    _merge_file(config_file, config_file, content, cache, env, debug=debug)
-    if not debug:
-        content.config = Configuration(config_path)
-
-    for dirpath, dirnames, filenames in os.walk(frame):
-        if dirpath == frame:
-            dirnames.remove(core.MERGE_CACHE)
-            special_folders = list(core.FRAME_SPECIALS)
-            if not debug:
-                locale_dirs = content.config.get('locale_dirs')
-                if locale_dirs is not None:
-                    special_folders.extend(locale_dirs)
-            for name in special_folders:
-                if name not in dirnames:
-                    continue
-                frame_file = os.path.join(dirpath, name)
-                source_file = os.path.join(source, os.path.relpath(dirpath, frame), name)
-                shutil.copytree(frame_file, source_file)
-                dirnames.remove(name)
-        for name in dirnames:
-            os.mkdir(os.path.join(source, os.path.relpath(dirpath, frame), name))
-        for name in filenames:
-            frame_file = os.path.join(dirpath, name)
-            source_file = os.path.join(source, os.path.relpath(frame_file, frame))
-            if fnmatch.fnmatch(name, core.EXT_RST):
-                _merge_file(frame_file, source_file, content, cache, env, debug=debug)
-            else:
-                shutil.copyfile(frame_file, source_file)
+    :param content: The path of the content file.
+    :param frame: The frame folder.
+    :param source: The source folder.
+    :param debug: Optional. Write the merged files without rendering them.
+    """
 
+    def __init__(self, content, frame, source, debug=False):
+        self.frame = frame
+        self.source = source
+        self.debug = debug
+        self.content = Content(content)
+        ext = os.path.splitext(core.EXT_JSON)[1]
+        merge_cache = os.path.join(frame, core.MERGE_CACHE)
+        cache_filename = os.path.join(merge_cache, "{name}{ext}".format(name=core.MERGE_CACHE, ext=ext))
+        with codecs.open(cache_filename, 'r', encoding='utf-8') as f:
+            self.cache = json.load(f)
+        self.env = core.template_environment()
+        self.config_path = os.path.normpath(os.path.join(frame, os.path.pardir))
+        self.config_file = os.path.join(self.config_path, core.CONF)
+        self.special_folders = list(core.FRAME_SPECIALS)
+
+    def merge_conf(self, update=False):
+        """
+        Merge the ``conf.py`` in place and load the configuration.
+        """
+        _merge_file(self.config_file, self.config_file, self.content, self.cache, self.env,
+                    debug=self.debug, update=update)
+        self.special_folders = list(core.FRAME_SPECIALS)
+        if not self.debug:
+            self.content.config = Configuration(self.config_path)
+            locale_dirs = self.content.config.get('locale_dirs')
+            if locale_dirs is not None:
+                self.special_folders.extend(locale_dirs)
+
+    def merge_all(self, update=False):
+        """
+        Merge all files of the frame.
+
+        :param update: Optional. Keep the existing source files whose merged text is unchanged.
+        :return: The number of written files.
+        """
+        frame, source = self.frame, self.source
+        written = 0
+        for dirpath, dirnames, filenames in os.walk(frame):
+            if dirpath == frame:
+                dirnames.remove(core.MERGE_CACHE)
+                for name in self.special_folders:
+                    if name not in dirnames:
+                        continue
+                    frame_file = os.path.join(dirpath, name)
+                    source_file = os.path.join(source, os.path.relpath(dirpath, frame), name)
+                    if update:
+                        written += sum(self.merge_file(os.path.join(root, f))
+                                       for root, _, files in os.walk(frame_file) for f in files)
+                    else:
+                        shutil.copytree(frame_file, source_file)
+                    dirnames.remove(name)
+            for name in dirnames:
+                os.makedirs(os.path.join(source, os.path.relpath(dirpath, frame), name), exist_ok=update)
+            for name in filenames:
+                written += self.merge_file(os.path.join(dirpath, name), update=update)
+        trace.count('files', written)
+        return written
+
+    def merge_file(self, frame_file, update=True):
+        """
+        Merge a single file of the frame. Files inside the special folders are copied.
+
+        :return: True if the source file was written.
+        """
+        rel_path = os.path.relpath(frame_file, self.frame)
+        source_file = os.path.join(self.source, rel_path)
+        if update:
+            os.makedirs(os.path.dirname(source_file), exist_ok=True)
+        special = rel_path.replace('\\', '/').split('/')[0] in self.special_folders
+        if fnmatch.fnmatch(frame_file, core.EXT_RST) and not special:
+            return _merge_file(frame_file, source_file, self.content, self.cache, self.env,
+                               debug=self.debug, update=update)
+        if update and _same_file(frame_file, source_file):
+            return False
+        shutil.copyfile(frame_file, source_file)
+        return True
+
+    def remove_file(self, frame_file):
+        """
+        Remove the source file of a removed frame file.
+        """
+        source_file = os.path.join(self.source, os.path.relpath(frame_file, self.frame))
+        if os.path.isfile(source_file):
+            print('removing:', source_file)
+            os.remove(source_file)
+
+
+def _same_file(a, b):
+    if not os.path.isfile(b) or os.path.getsize(a) != os.path.getsize(b):
+        return False
+    with open(a, 'rb') as fa, open(b, 'rb') as fb:
+        return fa.read() == fb.read()
+
+
+def _merge_file(src, dst, content, cache, env, debug=False, update=False):
+    """
+    Merge the frame file ``src`` into ``dst``.
 
-def _merge_file(src, dst, content, cache, env, debug=False):
+    :param update: Optional. Do not write ``dst`` if its text is unchanged.
+    :return: True if ``dst`` was written.
+    """
     text = io.StringIO()
     with io.open(src, 'r', encoding='utf-8') as f:
         print('reading:', src)
@@ -136,13 +205,24 @@ def _merge_file(src, dst, content, cache, env, debug=False):
                         print(src, 'Warning: unexpected text after "end-merge" tag in line', lno)
                     key = ''
 
+    value = text.getvalue()
+    text.close()
+    if not debug:
+        value = _compile(env, value).render({'content': content})
+    value += '\n'
+    if update and os.path.isfile(dst):
+        with io.open(dst, 'r', encoding='utf-8', newline='') as f:
+            if f.read() == value:
+                return False
     with io.open(dst, 'w', encoding='utf-8') as f:
         print('writing:', dst)
-        value = text.getvalue()
-        if debug:
-            f.write(value)
-        else:
-            template = env.from_string(value)
-            f.write(template.render({'content': content}))
-        f.write('\n')
-    text.close()
+        f.write(value)
+    return True
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(env, text):
+    """
+    The compiled template of a merged file. Unchanged files are compiled only once per process.
+    """
+    return env.from_string(text)
@@ -9,8 +9,9 @@ import json
 import re
 import io
 
-from . import core  # assuming this import is Python 3.10 compatible
+from . import core, trace  # assuming this import is Python 3.10 compatible
 
+@trace.traced('merge-cache')
 def create_merge_cache(env, frame, force=False, exclude=None):
     if exclude is None:
         exclude = []
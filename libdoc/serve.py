@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Serve
+~~~~~
+
+A long running ``libdoc`` process for editor integrations.
+
+``libdoc serve-daemon`` listens on a local TCP port (``127.0.0.1`` only) and runs the libdoc commands in-process.
+Between the requests the process keeps
+
+* the imported modules (Sphinx, Jinja, babel, ...),
+* the parsed content files (see :func:`~libdoc.content.keep_snapshots`),
+* the Jinja environment with its compiled templates (see :func:`~libdoc.core.template_environment`),
+* the Sphinx application of the last transformation (see :func:`~libdoc.transform.keep_applications`).
+
+Every request is a JSON object in a single line::
+
+    {"argv": ["generate", "-c", "lib.json"], "cwd": "C:\\\\Projects\\\\lib", "token": "..."}
+
+``argv`` are the command line arguments of ``libdoc``, ``cwd`` is the working directory of the command.
+``token`` is the content of the token file (see :func:`token_file`), which the daemon writes at its start.
+Only the user can read the file, so other users of the machine cannot run commands in the daemon.
+The answer is a JSON object in a single line as well::
+
+    {"code": 0, "output": "...", "elapsed": 0.12}
+
+Besides the libdoc commands the daemon understands ``ping``, ``stats`` (the counters of the caches) and ``shutdown``.
+The requests are handled one after the other, because the commands change the working directory.
+A connection without a request for :data:`~libdoc.core.SERVE_IDLE_TIMEOUT` seconds is closed,
+so an idle client cannot block the others.
+See :func:`send` for a client.
+"""
+import contextlib
+import hmac
+import io
+import json
+import os
+import secrets
+import socket
+import socketserver
+import time
+import traceback
+
+from . import core
+from .content import keep_snapshots, snapshot_stats
+from .exceptions import LibDocError, ServeError
+from .transform import keep_applications, application_stats
+
+HOST = '127.0.0.1'  #: The daemon accepts local connections only
+
+
+def token_file(port=None):
+    """
+    :param port: Optional. The local TCP port of the daemon. Defaults to :data:`~libdoc.core.SERVE_PORT`.
+    :return: The path of the access token file of the daemon (``~/.libdoc/serve-<port>.token``).
+    """
+    return os.path.join(os.path.expanduser('~'), core.CACHE_PATH[0],
+                        core.SERVE_TOKEN.format(int(port or core.SERVE_PORT)))
+
+
+def _write_token(path):
+    """
+    Write a new random token to ``path``, readable for the user only.
+
+    :return: The token.
+    """
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)  # a file of somebody else must not keep its permissions
+    token = secrets.token_hex(32)
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'w') as f:
+        f.write(token)
+    return token
+
+
+def _read_token(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError as ex:
+        raise ServeError('Not able to read the token of the daemon: {0} ({1})'.format(path, ex.strerror))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        self.timeout = self.server.idle_timeout  # applied to the socket by StreamRequestHandler.setup
+        super().setup()
+
+    def handle(self):
+        try:
+            self._handle()
+        except socket.timeout:
+            pass  # an idle connection is closed
+
+    def _handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line.decode('utf-8'))
+                argv = [str(arg) for arg in request['argv']]
+                token = str(request.get('token', ''))
+            except (ValueError, KeyError, TypeError) as ex:
+                response = {'code': 1, 'output': 'Invalid request: {0}\n'.format(ex), 'elapsed': 0.0}
+            else:
+                if not hmac.compare_digest(token.encode('utf-8'), self.server.token.encode('utf-8')):
+                    response = {'code': 1, 'output': 'Serve: invalid token\n', 'elapsed': 0.0}
+                    self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+                    break  # no further attempts on this connection
+                response = self.server.dispatch(argv, request.get('cwd'))
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+            if self.server.stopped:
+                break
+
+
+class Daemon(socketserver.TCPServer):
+    """
+    The socket server of ``libdoc serve-daemon``.
+
+    :param port: The local TCP port.
+    :param token: The token every request has to carry.
+    :param idle_timeout: Optional. The seconds until a connection without requests is closed.
+                         Defaults to :data:`~libdoc.core.SERVE_IDLE_TIMEOUT`.
+    """
+    allow_reuse_address = True
+
+    def __init__(self, port, token, idle_timeout=None):
+        super().__init__((HOST, port), _Handler)
+        self.token = token
+        self.idle_timeout = idle_timeout or core.SERVE_IDLE_TIMEOUT
+        self.stopped = False
+        self.requests = 0
+
+    def dispatch(self, argv, cwd=None):
+        """
+        Run a single request.
+
+        :return: The answer of the request.
+        """
+        command = argv[0] if argv else None
+        if command == 'ping':
+            return {'code': 0, 'output': 'pong\n', 'elapsed': 0.0}
+        if command == 'stats':
+            return {'code': 0, 'output': json.dumps(self.stats(), indent=4) + '\n', 'elapsed': 0.0}
+        if command == 'shutdown':
+            self.stopped = True
+            return {'code': 0, 'output': 'Serve: shutdown\n', 'elapsed': 0.0}
+        if command == 'serve-daemon':
+            return {'code': 1, 'output': 'Serve: the daemon is already running\n', 'elapsed': 0.0}
+        if cwd is not None and not (isinstance(cwd, str) and os.path.isdir(cwd)):
+            return {'code': 1, 'output': 'Serve: no such directory: {0}\n'.format(cwd), 'elapsed': 0.0}
+        self.requests += 1
+        return run(argv, cwd)
+
+    def stats(self):
+        return {'requests': self.requests, 'snapshots': snapshot_stats(),
+                'sphinx': application_stats(), 'names': core.name_cache_stats()}
+
+
+def run(argv, cwd=None):
+    """
+    Run the ``libdoc`` command line ``argv`` inside ``cwd`` and capture its output.
+
+    :return: A dict with the exit ``code``, the ``output`` and the ``elapsed`` time of the command.
+    """
+    from .__main__ import main
+
+    old_dir = os.getcwd()
+    output = io.StringIO()
+    code = 1
+    start = time.time()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            os.chdir(cwd or old_dir)
+            code = main(argv) or 0
+        except LibDocError as ex:
+            print("{0}: {1}".format(type(ex).__name__, ex))
+        except SystemExit as ex:  # docopt: --help, --version and usage errors
+            if isinstance(ex.code, str):
+                print(ex.code)
+            else:
+                code = ex.code or 0
+        except Exception:  # a failing command must not stop the daemon
+            traceback.print_exc()
+        finally:
+            os.chdir(old_dir)
+    return {'code': code, 'output': output.getvalue(), 'elapsed': round(time.time() - start, 3)}
+
+
+def serve(port=None):
+    """
+    Run the daemon until it receives a ``shutdown`` request.
+
+    :param port: Optional. The local TCP port. Defaults to :data:`~libdoc.core.SERVE_PORT`.
+    :return: 0
+    """
+    from .__main__ import load_command
+
+    port = int(port or core.SERVE_PORT)
+    keep_snapshots(core.SERVE_SNAPSHOTS)
+    keep_applications(True)
+    for command in ('clean', 'generate', 'merge', 'transform', 'make'):
+        load_command(command)  # pay the imports once
+    path = token_file(port)
+    try:
+        daemon = Daemon(port, _write_token(path))
+    except OSError as ex:
+        raise ServeError('Not able to listen on {0}:{1} ({2})'.format(HOST, port, ex.strerror))
+    try:
+        with daemon:
+            print('Serve: listening on {0}:{1}, token {2}'.format(HOST, port, path), flush=True)
+            while not daemon.stopped:
+                daemon.handle_request()
+    finally:
+        if os.path.isfile(path):
+            os.remove(path)
+    keep_applications(False)
+    keep_snapshots(0)
+    return 0
+
+
+def send(argv, cwd=None, port=None, timeout=None):
+    """
+    Send the ``libdoc`` command line ``argv`` to a running daemon.
+
+    :param cwd: Optional. The working directory of the command. Defaults to the current working directory.
+    :param port: Optional. The local TCP port of the daemon. Defaults to :data:`~libdoc.core.SERVE_PORT`.
+    :param timeout: Optional. The socket timeout in seconds.
+    :return: The answer of the daemon (see :func:`run`).
+    """
+    request = {'argv': list(argv), 'cwd': os.path.abspath(cwd or os.getcwd()), 'token': _read_token(token_file(port))}
+    with socket.create_connection((HOST, int(port or core.SERVE_PORT)), timeout) as connection:
+        connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with connection.makefile('rb') as f:
+            return json.loads(f.readline().decode('utf-8'))
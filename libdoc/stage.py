@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Stage
+~~~~~
+
+A small dependency graph for ``libdoc make``.
+
+Every :class:`Stage` declares its inputs (file hashes, configuration values, the libdoc version, ...)
+and its outputs. The :class:`BuildGraph` remembers the inputs of the last successful run of every stage
+and skips a stage as long as its inputs are unchanged and its outputs exist.
+"""
+import hashlib
+import json
+import os
+
+from . import __version__, trace
+
+
+def file_digest(path):
+    """
+    :return: The sha1 hex digest of the file content or ``None`` if the file does not exist.
+    """
+    if path is None or not os.path.isfile(path):
+        return None
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def tree_digest(folder, exclude=(), content=False):
+    """
+    :param content: Optional. Hash the file contents (see :func:`file_digest`) instead of the sizes and
+                    modification times, for folders whose files are rewritten with the same content.
+    :return: A digest over the relative names, sizes and modification times of all files inside ``folder``
+             or ``None`` if the folder does not exist.
+    """
+    if folder is None or not os.path.isdir(folder):
+        return None
+    sha1 = hashlib.sha1()
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if d not in exclude)
+        for f in sorted(files):
+            path = os.path.join(root, f)
+            name = os.path.relpath(path, folder).replace('\\', '/')
+            if content:
+                state = file_digest(path)
+            else:
+                stat = os.stat(path)
+                state = '{0}\0{1}'.format(stat.st_size, stat.st_mtime_ns)
+            sha1.update('{0}\0{1}\n'.format(name, state).encode('utf-8'))
+    return sha1.hexdigest()
+
+
+class Stage(object):
+    """
+    A step of the make pipeline.
+
+    :param name: The name of the stage.
+    :param action: A callable without arguments. It returns the stage product (a path) or ``None`` on failure.
+    :param inputs: A mapping of input names to JSON serializable values or callables returning such values.
+                   Callables are evaluated just before the stage is checked,
+                   so they can depend on the outputs of the previous stages,
+                   and again after a successful run, so they can depend on files the action creates.
+    :param outputs: The paths which exist after a successful run. The first one is the stage product.
+    :param requires: Optional. The names of the stages which have to succeed before this stage.
+                     Defaults to the stage added before.
+    """
+
+    def __init__(self, name, action, inputs=None, outputs=(), requires=None):
+        self.name = name
+        self.requires = requires
+        self.action = action
+        self.inputs = dict(inputs or {})
+        self.inputs.setdefault('libdoc', __version__)
+        self.outputs = list(outputs)
+        self.product = None
+
+    def fingerprint(self):
+        return {key: value() if callable(value) else value for key, value in self.inputs.items()}
+
+
+class BuildGraph(object):
+    """
+    Run a sequence of stages and skip every stage whose fingerprint is unchanged.
+
+    :param state_file: The JSON file which keeps the fingerprints of the last successful runs.
+    :param force: Optional. Run all stages regardless of their fingerprints.
+    :param explain: Optional. Print why each stage runs or is skipped.
+    """
+
+    def __init__(self, state_file, force=False, explain=False):
+        self._state_file = state_file
+        self._force = force
+        self._explain = explain
+        self._stages = []
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                self._state = json.load(f)
+        except (OSError, ValueError):
+            self._state = {}
+
+    def add(self, stage):
+        assert isinstance(stage, Stage)
+        self._stages.append(stage)
+        return stage
+
+    def reason(self, stage, fingerprint):
+        """
+        :return: The reason why ``stage`` has to run or ``None`` if it is up to date.
+        """
+        if self._force:
+            return 'forced'
+        previous = self._state.get(stage.name)
+        if previous is None:
+            return 'no previous run'
+        changed = sorted(key for key in set(fingerprint) | set(previous)
+                         if fingerprint.get(key) != previous.get(key))
+        if changed:
+            return 'changed input: {0}'.format(', '.join(changed))
+        missing = [path for path in stage.outputs if not os.path.exists(path)]
+        if missing:
+            return 'missing output: {0}'.format(', '.join(missing))
+        return None
+
+    def run(self):
+        """
+        Run the stages in the order they were added.
+        A failing stage stops all stages which require it, independent stages still run.
+
+        :return: A mapping of the stage names to the stage products. The product of a failed stage is ``None``.
+        """
+        results = {}
+        previous = None
+        for stage in self._stages:
+            requires = stage.requires if stage.requires is not None else [previous.name] if previous else []
+            previous = stage
+            failed = [name for name in requires if results.get(name) is None]
+            if failed:
+                print('Skip {0}: required stage {1} failed'.format(stage.name, ', '.join(failed)))
+                results[stage.name] = stage.product = None
+                continue
+            fingerprint = stage.fingerprint()
+            reason = self.reason(stage, fingerprint)
+            if reason is None:
+                print('Skip {0}: up to date'.format(stage.name))
+                if self._explain:
+                    print('    inputs unchanged: {0}'.format(', '.join(sorted(fingerprint))))
+                results[stage.name] = stage.product = stage.outputs[0] if stage.outputs else None
+                continue
+            if self._explain:
+                print('Run {0}: {1}'.format(stage.name, reason))
+            self._state.pop(stage.name, None)
+            with trace.span('stage.' + stage.name):
+                results[stage.name] = stage.product = stage.action()
+            if stage.product is not None:
+                # the action can create its own inputs, e.g. the default clean.conf
+                self._state[stage.name] = stage.fingerprint()
+            self._save()
+        return results
+
+    def _save(self):
+        with open(self._state_file, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, indent=4, sort_keys=True, separators=(',', ': '))
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Trace
+~~~~~
+
+Spans and counters which show where a libdoc command spends its time and memory.
+
+A span measures a part of a command, a counter counts its items::
+
+    with trace.span('merge'):
+        ...
+        trace.count('files', written)
+
+Every span records its wall and CPU time, the peak RSS of the process and optionally
+the peak of the traced Python allocations (:mod:`tracemalloc`, slows down the command).
+A counter belongs to the innermost open span and is summed up for the whole command as well.
+
+Tracing is off until :func:`start` is called (``libdoc --trace=<file> <command> ...``).
+Until then :func:`span` returns a shared no-op span and :func:`count` returns immediately.
+:func:`stop` writes the spans as JSON or in the Chrome trace event format
+(``chrome://tracing``, ``https://ui.perfetto.dev``).
+Spans inside worker processes (``libdoc batch``, concurrent exports) are not recorded.
+"""
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from .exceptions import TraceError
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FORMATS = ('json', 'chrome')  #: The output formats of :func:`stop`
+
+
+def _max_rss():
+    """
+    :return: The peak resident set size of the process in bytes or ``None`` if it is unknown.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # bytes on macOS, kilobytes elsewhere
+
+
+class Span(object):
+    """
+    A measured part of a command. Use :func:`span` to create it.
+    """
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self.name = name
+        self.args = args
+        self.depth = 0
+        self.start = self.wall = self.cpu = 0.0
+        self.max_rss = None
+        self.peak_memory = None
+        self.counters = {}
+        self._cpu_start = 0.0
+
+    def count(self, name, n=1):
+        """
+        Add ``n`` to the counter ``name`` of the span and of the command.
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+        totals = self._tracer.counters
+        totals[name] = totals.get(name, 0) + n
+
+    def __enter__(self):
+        tracer = self._tracer
+        stack = tracer.stack
+        self.depth = len(stack)
+        if tracer.memory:
+            # the peak so far belongs to the enclosing span, this span starts a new one
+            peak = tracemalloc.get_traced_memory()[1]
+            if stack:
+                stack[-1].peak_memory = max(stack[-1].peak_memory or 0, peak)
+            tracemalloc.reset_peak()
+            self.peak_memory = 0
+        stack.append(self)
+        self._cpu_start = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.wall = time.perf_counter() - self.start
+        self.cpu = time.process_time() - self._cpu_start
+        tracer = self._tracer
+        tracer.stack.pop()
+        self.max_rss = _max_rss()
+        if tracer.memory:
+            self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            if tracer.stack:
+                parent = tracer.stack[-1]
+                parent.peak_memory = max(parent.peak_memory or 0, self.peak_memory)
+        if exc_type is not None:
+            self.args = dict(self.args, error=exc_type.__name__)
+        tracer.spans.append(self)
+        return False
+
+    def as_dict(self, origin):
+        record = {'name': self.name, 'depth': self.depth, 'start': round(self.start - origin, 6),
+                  'wall': round(self.wall, 6), 'cpu': round(self.cpu, 6), 'max_rss': self.max_rss}
+        if self.peak_memory is not None:
+            record['peak_memory'] = self.peak_memory
+        if self.args:
+            record['args'] = self.args
+        if self.counters:
+            record['counters'] = self.counters
+        return record
+
+
+class _NullSpan(object):
+    """
+    The span of a disabled tracer.
+    """
+
+    def count(self, name, n=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Tracer(object):
+
+    def __init__(self, path, fmt, memory, command, owns_tracemalloc=False):
+        self.path = path
+        self.format = fmt
+        self.memory = memory
+        self.owns_tracemalloc = owns_tracemalloc  #: :func:`start` started :mod:`tracemalloc`
+        self.command = command
+        self.spans = []  #: The finished spans
+        self.stack = []  #: The open spans
+        self.counters = {}
+        self.created = datetime.now().replace(microsecond=0).isoformat()
+        self.origin = time.perf_counter()
+
+    def records(self):
+        return [s.as_dict(self.origin) for s in sorted(self.spans, key=lambda s: (s.start, s.depth))]
+
+    def chrome_events(self):
+        pid = os.getpid()
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                   'args': {'name': 'libdoc ' + ' '.join(self.command)}}]
+        for s in sorted(self.spans, key=lambda s: (s.start, s.depth)):
+            args = dict(s.args, cpu_ms=round(s.cpu * 1000, 3), **s.counters)
+            start = round((s.start - self.origin) * 1e6, 1)
+            end = round((s.start + s.wall - self.origin) * 1e6, 1)
+            events.append({'name': s.name, 'cat': 'libdoc', 'ph': 'X', 'pid': pid, 'tid': 0,
+                           'ts': start, 'dur': round(end - start, 1), 'args': args})
+            memory = {}
+            if s.max_rss is not None:
+                memory['max_rss'] = s.max_rss
+            if s.peak_memory is not None:
+                memory['peak_memory'] = s.peak_memory
+            if memory:
+                events.append({'name': 'memory', 'cat': 'libdoc', 'ph': 'C', 'pid': pid, 'tid': 0,
+                               'ts': end, 'args': memory})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self):
+        if self.format == 'chrome':
+            data = self.chrome_events()
+        else:
+            data = {'command': self.command, 'created': self.created,
+                    'wall': round(time.perf_counter() - self.origin, 6), 'max_rss': _max_rss(),
+                    'counters': self.counters, 'spans': self.records()}
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+
+
+_tracer = None
+
+
+def start(path, fmt='json', memory=False, command=()):
+    """
+    Record the following spans and counters of the process.
+
+    :param path: The trace file written by :func:`stop`.
+    :param fmt: Optional. One of :data:`FORMATS`. Defaults to json.
+    :param memory: Optional. Trace the Python allocations for the peak memory of every span.
+    :param command: Optional. The command line, stored in the trace file.
+    """
+    global _tracer
+    if fmt not in FORMATS:
+        raise TraceError('Unknown trace format: {0}'.format(fmt))
+    owns_tracemalloc = memory and not tracemalloc.is_tracing()
+    if owns_tracemalloc:
+        tracemalloc.start()
+    _tracer = _Tracer(os.path.abspath(path), fmt, memory, list(command), owns_tracemalloc)
+
+
+def stop():
+    """
+    Stop the recording and write the trace file.
+
+    :return: The path of the trace file or ``None`` if the tracing was not started.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    if tracer.owns_tracemalloc:  # a tracing of the host process (e.g. python -X tracemalloc) goes on
+        tracemalloc.stop()
+    tracer.write()
+    return tracer.path
+
+
+def enabled():
+    return _tracer is not None
+
+
+def span(name, **args):
+    """
+    :param name: The name of the span, e.g. ``generate``.
+    :param args: Optional. Additional values of the span, e.g. the builder.
+    :return: A context manager which measures the enclosed block.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return Span(_tracer, name, args)
+
+
+def count(name, n=1):
+    """
+    Add ``n`` to the counter ``name`` of the innermost open span.
+    """
+    if _tracer is None:
+        return
+    if _tracer.stack:
+        _tracer.stack[-1].count(name, n)
+    else:
+        _tracer.counters[name] = _tracer.counters.get(name, 0) + n
+
+
+def traced(name):
+    """
+    A decorator which measures every call of the function as span ``name``.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with Span(_tracer, name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -73,29 +73,33 @@
             </UL>
         </UL>
 """
+import contextlib
 import glob
+import hashlib
 import json
 import os
 import subprocess
 import sys
-import zipfile
 import zlib
 import fnmatch
 import re
-import io
+import shutil
+import tempfile
+import time
+import traceback
 
 from datetime import datetime
 import importlib.util
+from concurrent.futures import ProcessPoolExecutor
 
-import polib
 from sphinx.cmd.build import build_main  # Update import
 
 import unicodedata
 
-from . import core
+from . import archive, core, trace
 from .exceptions import HHCError, BuilderError, SourceError, LocalisationError
-from .transformer import transformer, transformers, create_builder_state
-from .wkhtmltox import HtmlSvgConverter, HtmlPdfConverter
+from .stage import file_digest
+from .transformer import transformer, transformers, create_builder_state, STATE
 
 
 def transform(builder='html', source=None, language=None):
@@ -119,10 +123,120 @@ def transform(builder='html', source=None, language=None):
     if transformer_function is None:
         raise BuilderError(f'The {builder} format is not supported')
     else:
-        return transformer_function(config, build, source, language)
+        with trace.span('transform.' + builder, language=language):
+            return transformer_function(config, build, source, language)
 
 
-@transformer('chm', 'Transforms the content of <source> to a compiled Microsoft HTML Help document.')
+class _Output(object):
+    """
+    Forward the output of a kept Sphinx application to the current ``sys.stdout`` or ``sys.stderr``,
+    which are redirected for every request of ``libdoc serve-daemon``.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    @property
+    def encoding(self):
+        return getattr(getattr(sys, self._name), 'encoding', None) or 'utf-8'
+
+    def write(self, text):
+        return getattr(sys, self._name).write(text)
+
+    def flush(self):
+        getattr(sys, self._name).flush()
+
+
+class _Applications(object):
+    """
+    The Sphinx application of the last build, kept for the next build with the same arguments.
+
+    A kept application skips reading the configuration, loading the extensions and the theme
+    and the unpickling of the environment. It reads only the outdated documents.
+    The docutils state of the application stays active as long as the application is kept.
+    """
+
+    def __init__(self):
+        self.keep = False
+        self.hits = self.misses = 0
+        self._key = self._app = self._stack = None
+
+    def close(self):
+        if self._stack is not None:
+            self._stack.close()
+        self._key = self._app = self._stack = None
+
+    def build(self, argv):
+        from sphinx.application import Sphinx
+        from sphinx.cmd.build import get_parser
+        from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+        args = get_parser().parse_args(argv)
+        confdir = args.confdir or args.sourcedir
+        # merge rewrites conf.py and transform the builder state for every run, only their content matters
+        key = (tuple(argv), file_digest(os.path.join(confdir, core.CONF)), file_digest(os.path.join(confdir, STATE)))
+        if key != self._key:
+            self.close()
+            self.misses += 1
+            stack = contextlib.ExitStack()
+            try:
+                stack.enter_context(patch_docutils(confdir))
+                stack.enter_context(docutils_namespace())
+                app = Sphinx(args.sourcedir, confdir, args.outputdir,
+                             args.doctreedir or os.path.join(args.outputdir, '.doctrees'), args.builder,
+                             confoverrides=dict(define.split('=', 1) for define in args.define),
+                             status=_Output('stdout'), warning=_Output('stderr'), tags=args.tags)
+            except BaseException:
+                stack.close()
+                raise
+            self._key, self._app, self._stack = key, app, stack
+        else:
+            self.hits += 1
+        try:
+            self._app.build(args.force_all, args.filenames)
+        except Exception:
+            traceback.print_exc()
+            self.close()
+            return 2
+        return self._app.statuscode
+
+
+_applications = _Applications()
+
+
+def keep_applications(keep=True):
+    """
+    Keep the Sphinx application of the last transformation for the following builds
+    of the process (e.g. ``libdoc serve-daemon``).
+    """
+    _applications.keep = keep
+    if not keep:
+        _applications.close()
+
+
+def application_stats():
+    """
+    :return: A dict with the ``hits`` and ``misses`` of the kept Sphinx application.
+    """
+    return {'hits': _applications.hits, 'misses': _applications.misses}
+
+
+def sphinx_build(argv):
+    """
+    Run ``sphinx-build`` in-process.
+
+    :param argv: The command line arguments. A leading program name ``sphinx-build`` is ignored.
+    :return: The exit code of the build.
+    """
+    if argv and argv[0] == 'sphinx-build':  # build_main expects the arguments only
+        argv = argv[1:]
+    with trace.span('sphinx-build', kept=_applications.keep):
+        if _applications.keep:
+            return _applications.build(argv)
+        return build_main(argv)
+
+
+@transformer('chm')
 def make_chm(config, build, source, language=None):
     code = build_hhp(config, build, source, language)
     if code != 0:
@@ -150,7 +264,7 @@ def build_hhp(config, build, source, language=None):
     destination = os.path.join(build, 'chm')
     if language is not None:
         destination = os.path.join(destination, language)
-    code = build_main(['sphinx-build',
+    code = sphinx_build(['sphinx-build',
                                 '-b', 'htmlhelp',
                                 '-c', config,  # The directory with conf.py,
                                 '-d', doctrees,
@@ -173,33 +287,50 @@ def fix_hhc(hhc):
     | The issue will be fixed by the removal of the ``ImageType`` property inside the ``text/site properties`` element.
     | The second issue will be fixed by injecting a additional ``<UL></UL>`` wrapper after the top level topic element.
       This will place the other topics in a additional TOC level.
+
+    The file is rewritten as a stream into a temporary file next to it, which replaces the original at the end.
+    As soon as the last fix is applied, the rest of the file is only stripped line by line.
     """
     state = 0
-    output = io.StringIO()
-    with open(hhc, "r", encoding='iso-8859-1') as f:
-        for line in f:
-            line = line.rstrip()
-            if state == 0 and '<OBJECT type="text/site properties">' in line:
-                state = 1
-            elif state == 1 and 'LibDoc -->' in line:
-                # This file is already fixed
-                return
-            elif state == 1 and '<param name="ImageType" value="Folder">' in line:
-                state = 2
-                # We want Book not Folders in the \*.chm file
-                line = line.replace(
-                    '<param name="ImageType" value="Folder">', '<!-- param name="ImageType" value="Folder" LibDoc -->')
-            elif state == 2 and '<OBJECT type="text/sitemap">' in line:
-                state = 3
-            elif state == 3 and '</OBJECT>' in line:
-                line += '\n<UL> <!-- LibDoc -->'
-                state = 4
-            elif state == 4 and '</UL></BODY></HTML>' in line:
-                line = '</UL> <!-- LibDoc -->\n' + line
-                state = 99
-            print(line, file=output)
-    with open(hhc, 'w', encoding='iso-8859-1') as f:
-        f.write(output.getvalue())
+    with open(hhc, 'r', encoding='iso-8859-1') as f, \
+            tempfile.NamedTemporaryFile('w', encoding='iso-8859-1', dir=os.path.dirname(os.path.abspath(hhc)),
+                                        suffix='.tmp', delete=False) as output:
+        try:
+            for line in f:
+                line = line.rstrip()
+                if state == 0 and '<OBJECT type="text/site properties">' in line:
+                    state = 1
+                elif state == 1 and 'LibDoc -->' in line:
+                    # This file is already fixed
+                    state = -1
+                    break
+                elif state == 1 and '<param name="ImageType" value="Folder">' in line:
+                    state = 2
+                    # We want Book not Folders in the \*.chm file
+                    line = line.replace(
+                        '<param name="ImageType" value="Folder">', '<!-- param name="ImageType" value="Folder" LibDoc -->')
+                elif state == 2 and '<OBJECT type="text/sitemap">' in line:
+                    state = 3
+                elif state == 3 and '</OBJECT>' in line:
+                    line += '\n<UL> <!-- LibDoc -->'
+                    state = 4
+                elif state == 4 and '</UL></BODY></HTML>' in line:
+                    line = '</UL> <!-- LibDoc -->\n' + line
+                    state = 99
+                print(line, file=output)
+                if state == 99:
+                    output.writelines(rest.rstrip() + '\n' for rest in f)
+                    break
+        except BaseException:
+            state = -1
+            raise
+        finally:
+            output.close()
+            if state == -1:
+                os.remove(output.name)
+    if state != -1:
+        shutil.copymode(hhc, output.name)  # the temporary file is private (0600)
+        os.replace(output.name, hhc)
 
 
 def compile_hhp(hhp):
@@ -241,7 +372,7 @@ def compile_hhp(hhp):
     return code
 
 
-@transformer('html', 'Transforms the content of <source> to a collection of static html pages.')
+@transformer('html')
 def make_html(config, build, source, language=None):
     doctrees = os.path.join(build, 'doctrees')
     if language is None:
@@ -258,7 +389,7 @@ def make_html(config, build, source, language=None):
     #                             destination,  # Destination directory
     #                             ])
     # return code
-    code = build_main(['sphinx-build',
+    code = sphinx_build(['sphinx-build',
                             '-b', 'html',
                             '-c', config,  # The directory with conf.py,
                             '-d', doctrees,
@@ -267,10 +398,14 @@ def make_html(config, build, source, language=None):
                             source,  # Source directory
                             destination,  # Destination directory
                             ])
+    if code == 0:
+        write_symbols(config, source, destination)
+    return code
 
 
-@transformer('pdf', 'Transforms the content of <source> to a document in pdf format.')
+@transformer('pdf')
 def make_pdf(config, build, source, language=None):
+    from .wkhtmltox import HtmlPdfConverter
     doctrees = os.path.join(build, 'doctrees')
     if language is None:
         source_dir = os.path.join(build, 'pdf', 'html')
@@ -278,7 +413,7 @@ def make_pdf(config, build, source, language=None):
     else:
         source_dir = os.path.join(build, 'pdf', language, 'html')
         destination_dir = os.path.join(build, 'pdf', 'language')
-    code = build_main(['sphinx-build',
+    code = sphinx_build(['sphinx-build',
                                 '-b', 'singlehtml',
                                 '-c', config,  # The directory with conf.py
                                 '-d', doctrees,
@@ -326,13 +461,13 @@ def pdf_name_from_project(project):
     return value
 
 
-@transformer('pot', 'Transforms the content of <source> to a gettext-style message catalog, basis for localisation.')
+@transformer('pot')
 def make_pot(config, build, source, language=None):
     if language is not None:
         language = None
 
     doctrees = os.path.join(build, 'pottrees')
-    code = build_main(['sphinx-build',
+    code = sphinx_build(['sphinx-build',
                                 '-b', 'gettext',
                                 '-c', config,  # The directory with conf.py,
                                 '-d', doctrees,
@@ -349,8 +484,18 @@ def make_pot(config, build, source, language=None):
     return code
 
 
-def update_pot(locale_dir, pot_dir, languages=None):
+def update_pot(locale_dir, pot_dir, languages=None, jobs=None):
+    """
+    Create or update the ``*.po`` catalogs in ``locale_dir`` for every ``*.pot`` template in ``pot_dir``.
+
+    | Every template is parsed once. The per-language merges run in a process pool.
+    | A catalog is skipped when the message-id digest of its template matches the digest
+      recorded at its last merge (see :data:`core.POT_DIGESTS_JSON`).
 
+    :param jobs: Optional. The number of worker processes. Defaults to the number of CPUs.
+    :return: A mapping with the number of ``created``, ``updated`` and ``unchanged`` catalogs.
+    """
+    import polib
     if not os.path.exists(pot_dir):
         raise LocalisationError("Not able to find the *.pot file folder: '{}'".format(pot_dir))
     if languages is None:
@@ -364,6 +509,16 @@ def update_pot(locale_dir, pot_dir, languages=None):
     if languages is None:
         languages = core.LOCALISATION_LIST
 
+    start = time.perf_counter()
+    digests_file = os.path.join(locale_dir, core.POT_DIGESTS_JSON)
+    try:
+        with open(digests_file, 'r', encoding='utf-8') as f:
+            digests = json.load(f)
+    except (OSError, ValueError):
+        digests = {}
+
+    stats = {'created': 0, 'updated': 0, 'unchanged': 0}
+    tasks = []
     for dirpath, dirnames, filenames in os.walk(pot_dir):
         for filename in filenames:
             pot_file = os.path.join(dirpath, filename)
@@ -371,42 +526,88 @@ def update_pot(locale_dir, pot_dir, languages=None):
             if ext != ".pot":
                 continue
             basename = os.path.relpath(base, pot_dir)
+            pot = polib.pofile(pot_file)
+            digest = _msgid_digest(pot)
             for lang in languages:
-                po_dir = os.path.join(locale_dir, lang, 'LC_MESSAGES')
-                po_file = os.path.join(po_dir, basename + ".po")
-                out_dir = os.path.dirname(po_file)
-                if not os.path.exists(out_dir):
-                    os.makedirs(out_dir)
-
-                pot = polib.pofile(pot_file)
-                if os.path.exists(po_file):
-                    po = polib.pofile(po_file)
-                    msg_ids = set([str(m) for m in po])
-                    po.merge(pot)
-                    new_msg_ids = set([str(m) for m in po])
-                    if msg_ids != new_msg_ids:
-                        added = new_msg_ids - msg_ids
-                        deleted = msg_ids - new_msg_ids
-                        print('Update:', po_file, "+%d, -%d" % (
-                            len(added), len(deleted)))
-                        po.save(po_file)
-                    else:
-                        print('Not Changed:', po_file)
-                else:
-                    po = polib.POFile()
-                    po.metadata = pot.metadata
-                    print('Create:', po_file)
-                    po.merge(pot)
-                    po.save(po_file)
-
-
-@transformer('latex', 'Transforms the content of <source> to a bunch of LaTeX files, basis for pdf transformation.')
+                po_file = os.path.join(locale_dir, lang, 'LC_MESSAGES', basename + ".po")
+                key = os.path.relpath(po_file, locale_dir).replace('\\', '/')
+                if digests.get(key) == digest and os.path.exists(po_file):
+                    stats['unchanged'] += 1
+                    continue
+                tasks.append((key, digest, pot, po_file))
+
+    def report(task, result):
+        key, digest = task[:2]
+        po_file, status, added, deleted, elapsed = result
+        stats[status] += 1
+        digests[key] = digest
+        if status == 'created':
+            print('Create:', po_file, "({0:.2f} s)".format(elapsed))
+        elif status == 'updated':
+            print('Update:', po_file, "+%d, -%d" % (added, deleted), "({0:.2f} s)".format(elapsed))
+        else:
+            print('Not Changed:', po_file)
+
+    if len(tasks) > 1 and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_merge_catalog, task[2], task[3]) for task in tasks]
+            for task, future in zip(tasks, futures):
+                report(task, future.result())
+    else:
+        for task in tasks:
+            report(task, _merge_catalog(task[2], task[3]))
+
+    if tasks:
+        with open(digests_file, 'w', encoding='utf-8') as f:
+            json.dump(digests, f, indent=4, sort_keys=True, separators=(',', ': '))
+    print("Catalogs: {created} created, {updated} updated, {unchanged} unchanged".format(**stats),
+          "({0:.2f} s)".format(time.perf_counter() - start))
+    return stats
+
+
+def _msgid_digest(pot):
+    ids = sorted('{0}\x04{1}'.format(entry.msgctxt or '', entry.msgid) for entry in pot)
+    return hashlib.sha1('\x00'.join(ids).encode('utf-8')).hexdigest()
+
+
+def _merge_catalog(pot, po_file):
+    """
+    Merge the parsed template ``pot`` into the catalog ``po_file``. Runs inside a worker process.
+
+    :return: A tuple ``(po_file, status, added, deleted, elapsed)``
+    """
+    import polib
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(po_file), exist_ok=True)
+    added = deleted = 0
+    if os.path.exists(po_file):
+        po = polib.pofile(po_file)
+        msg_ids = set([str(m) for m in po])
+        po.merge(pot)
+        new_msg_ids = set([str(m) for m in po])
+        if msg_ids != new_msg_ids:
+            added = len(new_msg_ids - msg_ids)
+            deleted = len(msg_ids - new_msg_ids)
+            status = 'updated'
+            po.save(po_file)
+        else:
+            status = 'unchanged'
+    else:
+        po = polib.POFile()
+        po.metadata = pot.metadata
+        po.merge(pot)
+        po.save(po_file)
+        status = 'created'
+    return po_file, status, added, deleted, time.perf_counter() - start
+
+
+@transformer('latex')
 def make_latex(config, build, source, language=None):
     doctrees = os.path.join(build, 'doctrees')
     destination = os.path.join(build, 'latex')
     if language is not None:
         destination = os.path.join(destination, language)
-    code = build_main(['sphinx-build',
+    code = sphinx_build(['sphinx-build',
                                 '-b', 'latex',
                                 '-c', config,  # The directory with conf.py,
                                 '-d', doctrees,
@@ -418,13 +619,13 @@ def make_latex(config, build, source, language=None):
     return code
 
 
-@transformer('json', 'Transforms the content of <source> to a directory with JSON files.')
+@transformer('json')
 def make_json(config, build, source, language=None):
     doctrees = os.path.join(build, 'doctrees')
     destination = os.path.join(build, 'json')
     if language is not None:
         destination = os.path.join(destination, language)
-    code = build_main(['sphinx-build',
+    code = sphinx_build(['sphinx-build',
                                 '-b', 'json',
                                 '-c', config,  # The directory with conf.py,
                                 '-d', doctrees,
@@ -436,13 +637,13 @@ def make_json(config, build, source, language=None):
     return code
 
 
-@transformer('xml', 'Transforms the content of <source> to the Docutils native XML files.')
+@transformer('xml')
 def make_xml(config, build, source, language=None):
     doctrees = os.path.join(build, 'doctrees')
     destination = os.path.join(build, 'xml')
     if language is not None:
         destination = os.path.join(destination, language)
-    code = build_main(['sphinx-build',
+    code = sphinx_build(['sphinx-build',
                                 '-b', 'xml',
                                 '-c', config,  # The directory with conf.py,
                                 '-d', doctrees,
@@ -454,14 +655,15 @@ def make_xml(config, build, source, language=None):
     return code
 
 
-@transformer('lmd', 'Transforms the content of <source> to a CODESYS compatible library manager documentation element.')
+@transformer('lmd')
 def make_lmd(config, build, source, language=None):
+    from .wkhtmltox import HtmlSvgConverter
     doctrees = os.path.join(build, 'doctrees')
     lmd_folder = os.path.join(build, 'lmd')
     destination = lmd_folder
     if language is not None:
         destination = os.path.join(lmd_folder, language)
-    code = build_main(['sphinx-build',
+    code = sphinx_build(['sphinx-build',
                                 '-b', 'html',
                                 '-c', config,  # The directory with conf.py,
                                 '-d', doctrees,
@@ -523,6 +725,8 @@ def make_lmd(config, build, source, language=None):
     data = read_inventory(inventory_file)
     if not data:
         return 1
+    # the symbol index ships next to the lmd file, not inside it
+    index_file = write_symbols(config, source, destination, data)
 
     # generate a manifest file in JSON format
     data = {'header': {'name': core.MANIFEST_JSON,
@@ -542,68 +746,104 @@ def make_lmd(config, build, source, language=None):
     print(" done")
 
     # collect all necessary files and put these files in a zip archive
-    # http://stackoverflow.com/questions/1855095/how-to-create-a-zip-archive-of-a-directory-in-python
-    with zipfile.ZipFile(lmd_path, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        print('generate', lmd_file, '...', end="")
-        for root, dirs, files in os.walk(destination):
-            # add directory (needed for empty dirs)
-            zip_file.write(root, os.path.relpath(root, destination))
-            if "_sources" in dirs:
-                dirs.remove("_sources")
-            for f in files:
-                if f in [lmd_file, "search.html", "searchindex.js", "todo.html", "genindex.html", ".buildinfo"]:
-                    continue
-                file_name = os.path.join(root, f)
-                if os.path.isfile(file_name):  # regular files only
-                    relative_file_name = os.path.join(os.path.relpath(root, destination), f)
-                    zip_file.write(file_name, relative_file_name)
-        print(' done')
+    print('generate', lmd_file, '...', end="")
+    skip_files = ["search.html", "searchindex.js", "todo.html", "genindex.html", ".buildinfo"]
+    if index_file is not None:
+        skip_files.append(os.path.basename(index_file))
+    count, reused = archive.pack(destination, lmd_path, skip_files=skip_files, skip_dirs=["_sources"])
+    print(' done ({0} entries, {1} reused)'.format(count, reused))
     return code
 
 
+def write_symbols(config, source, destination, inventory=None):
+    """
+    Write the symbol index ``<library>.symbols.json`` of the documented library into ``destination``.
+
+    The index maps the symbols of the frame (see :data:`~libdoc.core.SYMBOLS_JSON`) to their locations inside
+    the documentation. :class:`~libdoc.content.Content` loads the indexes of the referenced libraries
+    (see :data:`~libdoc.core.LIBDOC_SYMBOLS`) and links their symbols without loading their contents.
+    The links start with the ``html_baseurl`` of ``conf.py``. Without it they point to the folder of the index.
+
+    :param inventory: Optional. The already read ``objects.inv`` of ``destination``.
+    :return: The path of the index or ``None`` without a symbol table or an inventory.
+    """
+    try:
+        with open(os.path.join(source, core.FRAME_JSON), 'r', encoding='utf-8') as f:
+            library = json.load(f)['library']
+        with open(os.path.join(source, core.SYMBOLS_JSON), 'r', encoding='utf-8') as f:
+            symbols = json.load(f)['symbols']
+    except (IOError, ValueError, KeyError):
+        return None
+    if inventory is None:
+        inventory_file = os.path.join(destination, 'objects.inv')
+        if not os.path.isfile(inventory_file):
+            return None
+        inventory = read_inventory(inventory_file)
+    labels = inventory.get('std:label', {})
+    locations = {}
+    for key, target in symbols.items():
+        label = labels.get(target.lower())  # sphinx-doc normalizes the labels
+        if label is not None:
+            locations[key] = label['location']
+
+    index_file = os.path.join(destination, core.EXT_SYMBOLS_JSON.replace('*', os.path.splitext(library['file'])[0]))
+    data = {'header': {'name': os.path.basename(index_file),
+                       'version': '0.0.0.1',
+                       'created': datetime.utcnow().replace(microsecond=0).isoformat()},
+            'library': library,
+            'url': core.read_conf(config).get('html_baseurl') or None,
+            'symbols': locations}
+    with open(index_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    print('generate', os.path.basename(index_file), '({0} symbols)'.format(len(locations)))
+    return index_file
+
+
 def read_inventory(inv_file):
+    """
+    Read a Sphinx ``objects.inv`` (version 2) file.
+
+    The compressed part is decompressed, split and parsed in one linear pass.
 
+    :return: A mapping ``{entry_type: {name: {'location': ..., 'name': ...}}}``
+    """
     data = {}
     with open(inv_file, 'rb') as f:
-        line = f.readline()
-        inv_format = line.rstrip().decode('utf-8')
-        line = f.readline()
-        title = line.rstrip()[11:].decode('utf-8')
-        line = f.readline().decode()
-        version = line.rstrip()[11:].decode('utf-8')
-        line = f.readline().decode('utf-8')
-        if 'zlib' not in line:
+        inv_format = f.readline().rstrip().decode('utf-8')
+        title = f.readline().rstrip()[11:].decode('utf-8')
+        version = f.readline().rstrip()[11:].decode('utf-8')
+        if b'zlib' not in f.readline():
             raise ValueError
 
-        def read_chunks():
-            decompressor = zlib.decompressobj()
-            for chunk in iter(lambda: f.read(16 * 1024), ''):
-                yield decompressor.decompress(chunk)
-            yield decompressor.flush()
-
-        def split_lines(iterator):
-            buf = ''
-            for chunk in iterator:
-                buf += chunk
-                line_end = buf.find('\n')
-                while line_end != -1:
-                    yield buf[:line_end].decode('utf-8')
-                    buf = buf[line_end + 1:]
-                    line_end = buf.find('\n')
-            assert not buf
-
         print('reading', inv_format[2:], 'for', title, version, '...', end="")
-        for line in split_lines(read_chunks()):
+        for line in _inventory_lines(f):
             # be careful to handle names with embedded spaces correctly
-            m = re.match(r'(?x)(.+?)\s+(\S*:\S*)\s+(\S+)\s+(\S+)\s+(.*)',
-                         line.rstrip())
+            m = core.INVENTORY_LINE_REGEX.match(line.rstrip())
             if not m:
                 continue
             name, entry_type, __, location, display_name = m.groups()
-            if location.endswith(u'$'):
+            if location.endswith('$'):
                 location = location[:-1] + name
             location = os.path.join('.', location)
             data.setdefault(entry_type, {})[name] = {'location': location.replace('\\', '/').replace('./', ''),
                                                      'name': display_name}
         print(' done')
     return data
+
+
+def _inventory_lines(f, chunk_size=64 * 1024):
+    """
+    Decompress the rest of the file ``f`` chunk by chunk and yield its decoded lines.
+    Only the incomplete last line of a chunk is carried over to the next chunk.
+    """
+    decompressor = zlib.decompressobj()
+    tail = b''
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+        lines = (tail + decompressor.decompress(chunk)).split(b'\n')
+        tail = lines.pop()
+        for line in lines:
+            yield line.decode('utf-8')
+    tail += decompressor.flush()
+    for line in tail.split(b'\n'):
+        if line:
+            yield line.decode('utf-8')
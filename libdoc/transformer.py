@@ -2,6 +2,7 @@
 """
     The implementation of the Transformer decorator
 """
+import importlib
 import io
 import os
 import sys
@@ -9,13 +10,27 @@ from collections.abc import Mapping, Set
 
 from .exceptions import BuilderError
 
-__all__ = ["transformer", "builders", "transformers", "STATE", "create_builder_state", "builder_docs"]
+__all__ = ["transformer", "builders", "transformers", "STATE", "BUILDERS", "create_builder_state", "builder_docs"]
 
 STATE = 'libdoc_builder.py'  #: The name of the builder state file
 
-_builders = set()
+#: The available builders and their descriptions.
+#: The builders are known without importing :mod:`libdoc.transform` (and sphinx),
+#: the transformer functions are bound when :data:`transformers` is used the first time.
+BUILDERS = {
+    'chm': 'Transforms the content of <source> to a compiled Microsoft HTML Help document.',
+    'html': 'Transforms the content of <source> to a collection of static html pages.',
+    'pdf': 'Transforms the content of <source> to a document in pdf format.',
+    'pot': 'Transforms the content of <source> to a gettext-style message catalog, basis for localisation.',
+    'latex': 'Transforms the content of <source> to a bunch of LaTeX files, basis for pdf transformation.',
+    'json': 'Transforms the content of <source> to a directory with JSON files.',
+    'xml': 'Transforms the content of <source> to the Docutils native XML files.',
+    'lmd': 'Transforms the content of <source> to a CODESYS compatible library manager documentation element.',
+}
+
+_builders = set(BUILDERS)
 _transformers = {}
-_doc = {}
+_doc = BUILDERS
 
 
 class _BuilderProperty(Set):
@@ -38,14 +53,19 @@ class _TransformerProperty(Mapping):
     def __init__(self, transformer_mapping):
         self.transformers = transformer_mapping
 
+    def _load(self):
+        if not self.transformers:
+            importlib.import_module('.transform', __package__)  # binds the transformer functions
+        return self.transformers
+
     def __len__(self):
-        return len(self.transformers)
+        return len(self._load())
 
     def __iter__(self):
-        return iter(self.transformers)
+        return iter(self._load())
 
     def __getitem__(self, key):
-        return self.transformers[key]
+        return self._load()[key]
 
 
 def format_doc(indent):
@@ -58,12 +78,10 @@ transformers = _TransformerProperty(_transformers)
 builder_docs = format_doc
 
 
-def transformer(builder, doc=''):
+def transformer(builder):
     assert isinstance(builder, str)
-    assert isinstance(doc, str)
-    assert builder not in _builders, f"Format '{builder}' is already implemented"
-    _builders.add(builder)
-    _doc[builder] = doc
+    assert builder in _builders, f"Format '{builder}' is not declared in BUILDERS"
+    assert builder not in _transformers, f"Format '{builder}' is already implemented"
 
     def decorator(func):
         _transformers[builder] = func
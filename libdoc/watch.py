@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Watch
+~~~~~
+
+Keep the documentation of a library up to date while its frame is edited.
+
+``libdoc watch`` polls the content file, the frame folder, the templates and ``conf.py``
+and runs only the necessary part of ``merge`` and ``transform`` after every change:
+
+* a changed frame file is merged again (or removed from the source structure),
+* a changed ``conf.py`` or content file merges all frame files again,
+* changed templates update the merge cache and merge all frame files again.
+
+Source files whose merged text is unchanged are not written, so Sphinx reads only the changed documents.
+The Sphinx application is kept between the builds (see :func:`~libdoc.transform.keep_applications`).
+Polling needs no file system notification service. Changes are collected until the files are quiet
+for :data:`~libdoc.core.WATCH_DEBOUNCE` seconds, so an editor writing several files triggers a single build.
+"""
+import fnmatch
+import os
+import time
+
+from . import core
+from .exceptions import MergeError
+from .merge import FrameMerge
+from .mergecache import create_merge_cache
+from .transform import transform, keep_applications
+
+
+class StatCache(object):
+    """
+    Remember the modification times and sizes of files and detect their changes by polling.
+
+    :param roots: The watched files and folders.
+    :param skip_dirs: Folder names which are not watched.
+    """
+
+    def __init__(self, roots, skip_dirs=()):
+        self._roots = list(roots)
+        self._skip_dirs = set(skip_dirs)
+        self._stats = self.scan()
+
+    def scan(self):
+        """
+        :return: A mapping of all watched file paths to ``(mtime, size)``.
+        """
+        stats = {}
+        for root in self._roots:
+            if os.path.isdir(root):
+                self._scan_dir(root, stats)
+            else:
+                try:
+                    stat = os.stat(root)
+                except OSError:
+                    continue
+                stats[root] = stat.st_mtime_ns, stat.st_size
+        return stats
+
+    def _scan_dir(self, folder, stats):
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if entry.name not in self._skip_dirs:
+                        self._scan_dir(entry.path, stats)
+                else:
+                    stat = entry.stat()
+                    stats[entry.path] = stat.st_mtime_ns, stat.st_size
+            except OSError:  # removed while scanning
+                continue
+
+    def changes(self):
+        """
+        Scan again and remember the new state.
+
+        :return: A tuple with the sets of the changed (or new) and the removed files.
+        """
+        stats = self.scan()
+        changed = {path for path, stat in stats.items() if self._stats.get(path) != stat}
+        removed = set(self._stats) - set(stats)
+        self._stats = stats
+        return changed, removed
+
+    def refresh(self, path):
+        """
+        Accept the current state of ``path``, e.g. after writing it.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._stats.pop(path, None)
+        else:
+            self._stats[path] = stat.st_mtime_ns, stat.st_size
+
+
+def watch(content=None, frame=None, builder='html', interval=None):
+    """
+    Merge and transform the frame after every change until the process is interrupted (Ctrl+C).
+
+    :param content: Optional. The content file. Defaults to the first ``*.json`` file in the working directory.
+    :param frame: Optional. The frame folder. Defaults to ``Frame`` next to the content file.
+    :param builder: Optional. The transformation (see ``libdoc transform``). Defaults to html.
+    :param interval: Optional. The polling interval in seconds. Defaults to :data:`~libdoc.core.WATCH_INTERVAL`.
+    :return: 0
+    """
+    if content is None:
+        files = [f for f in fnmatch.filter(os.listdir('.'), core.EXT_JSON)
+                 if not fnmatch.fnmatch(f, core.EXT_CLEAN_JSON) and not fnmatch.fnmatch(f, core.EXT_SYMBOLS_JSON)]
+        if files:
+            content = files[0]
+    if content is None or not os.path.isfile(content) or not fnmatch.fnmatch(content, core.EXT_JSON):
+        raise MergeError('Not able to find content: {content}'.format(content=content))
+    content = os.path.abspath(content)
+    if frame is None:
+        frame = os.path.join(os.path.dirname(content), core.FRAME)
+    if not os.path.isdir(frame):
+        raise MergeError('Not able to find frame: {frame}'.format(frame=frame))
+    frame = os.path.abspath(frame)
+    source = os.path.join(os.path.dirname(frame), core.SOURCE)
+    interval = float(interval or core.WATCH_INTERVAL)
+
+    env = core.template_environment()
+    templates = [os.path.abspath(location) for location in env.loader.searchpath]
+    template_dirs = tuple(location + os.sep for location in templates)
+    merger = FrameMerge(content, frame, source)
+    conf = merger.config_file
+
+    keep_applications(True)
+    print('Watch:', content, frame, '->', builder)
+    merger.merge_conf(update=True)
+    merger.merge_all(update=True)
+    transform(builder, source)
+
+    stats = StatCache([content, conf, frame] + templates, skip_dirs=[core.MERGE_CACHE])
+    stats.refresh(conf)
+    try:
+        while True:
+            time.sleep(interval)
+            changed, removed = stats.changes()
+            if not changed and not removed:
+                continue
+            # wait until the editor is done
+            quiet = time.time()
+            while time.time() - quiet < core.WATCH_DEBOUNCE:
+                time.sleep(min(interval, core.WATCH_DEBOUNCE))
+                more_changed, more_removed = stats.changes()
+                if more_changed or more_removed:
+                    changed = (changed - more_removed) | more_changed
+                    removed = (removed - more_changed) | more_removed
+                    quiet = time.time()
+
+            start = time.time()
+            templates_changed = any(path.startswith(template_dirs) for path in changed | removed)
+            if templates_changed:
+                create_merge_cache(env, frame, force=True)
+            if content in changed or templates_changed:
+                merger = FrameMerge(content, frame, source)
+            written = 0
+            if content in changed or conf in changed or templates_changed:
+                merger.merge_conf(update=True)
+                stats.refresh(conf)
+                written = merger.merge_all(update=True)
+            else:
+                for path in sorted(changed):
+                    if path.startswith(frame + os.sep):
+                        written += merger.merge_file(path)
+                for path in sorted(removed):
+                    if path.startswith(frame + os.sep):
+                        merger.remove_file(path)
+                        written += 1
+            if written or conf in changed:
+                code = transform(builder, source)
+            else:
+                code = 0
+            print('Watch: {0} changes, {1} written, result {2} ({3:.2f} s)'.format(
+                len(changed | removed), written, code, time.time() - start), flush=True)
+    except KeyboardInterrupt:
+        print('Watch: stopped')
+    finally:
+        keep_applications(False)
+    return 0
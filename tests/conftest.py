@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+
+def _info(content, info_type='string'):
+    return {'Content': content, 'Type': info_type}
+
+
+CONTENT = {
+    'FileHeader': {'creationDateTime': '2020-01-01T10:00:00', 'libraryFile': 'Test.library',
+                   'productProfile': 'CODESYS V3.5'},
+    'ProjectInformation': {'Title': _info('Test'), 'Version': _info('1.0.0.0'), 'Company': _info('ACME'),
+                           'Author': _info('me'), 'LastModificationDateTime': _info('2020-01-01T10:00:00', 'date'),
+                           'Description': _info('A |FB_Test| library')},
+    'Libraries': {},
+    'DataTypes': {'ST_Data': {'Name': 'ST_Data', 'ObjectType': 'Struct', 'Doc': 'data',
+                              'Members': [{'Name': 'a', 'Type': {'Class': 'INT'}}]}},
+    'Interfaces': {},
+    'GlobalObjects': {},
+    'POUs': {'FB_Test': {'Name': 'FB_Test', 'ObjectType': 'FunctionBlock', 'Doc': 'Test |ST_Data| block',
+                         'STDeclaration': 'FUNCTION_BLOCK FB_Test\nVAR_INPUT\n  x : INT;\nEND_VAR',
+                         'Verbatim': 'FUNCTION_BLOCK FB_Test',
+                         'Variables': [{'Name': 'x', 'Scope': ['input'], 'Type': {'Class': 'ST_Data'}}]}},
+    'ProjectStructure': {'Content': [{'Object': 'POUs.FB_Test'}, {'Object': 'DataTypes.ST_Data'}]},
+}
+
+
+@pytest.fixture
+def content_file(tmp_path):
+    """
+    A small exported content ``Test.json`` inside its own project folder.
+    """
+    path = tmp_path / 'Test.json'
+    path.write_text(json.dumps(CONTENT, indent=1), encoding='utf-8')
+    return path
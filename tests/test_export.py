@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+import pytest
+
+from libdoc import core, export
+
+STAND_IN = '''\
+#!{python}
+# A stand-in for CODESYS.EXE: writes a canned content file and records every call.
+import json
+import os
+import sys
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+with open(os.path.join(here, 'calls.txt'), 'a', encoding='utf-8') as f:
+    f.write(os.getcwd() + '\\n')
+with open(os.path.join(here, 'calls.txt'), 'r', encoding='utf-8') as f:
+    calls = len(f.readlines())
+mode = os.environ.get('STAND_IN_MODE', '')
+if mode == 'sleep':
+    time.sleep(60)
+if mode == 'busy' and calls < 3:
+    sys.exit(2)  # the library is in use
+argument = [arg for arg in sys.argv if arg.startswith('--docexport=')][0]
+library, content = argument[len('--docexport='):].strip('"').split('|')
+with open(content, 'w', encoding='utf-8') as f:
+    json.dump({{'library': os.path.basename(library), 'call': calls}}, f)
+'''
+
+
+class StandIn(object):
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.exe = os.path.join(folder, 'codesys.py')
+        with open(self.exe, 'w', encoding='utf-8') as f:
+            f.write(STAND_IN.format(python=sys.executable))
+        os.chmod(self.exe, 0o755)
+
+    @property
+    def calls(self):
+        try:
+            with open(os.path.join(self.folder, 'calls.txt'), 'r', encoding='utf-8') as f:
+                return [line.rstrip('\n') for line in f]
+        except FileNotFoundError:
+            return []
+
+
+@pytest.fixture
+def stand_in(tmp_path, monkeypatch):
+    """
+    A stand-in CODESYS executable as host application with an empty export cache.
+    """
+    folder = tmp_path / 'codesys'
+    folder.mkdir()
+    stand_in = StandIn(str(folder))
+    monkeypatch.setattr(core, 'get_configuration', lambda: None)
+    monkeypatch.setenv(core.LIBDOC_CODESYS, stand_in.exe)
+    monkeypatch.setenv(core.LIBDOC_CACHE, str(tmp_path / 'cache'))
+    monkeypatch.delenv('STAND_IN_MODE', raising=False)
+    return stand_in
+
+
+@pytest.fixture
+def library(tmp_path):
+    path = tmp_path / 'Test.library'
+    path.write_bytes(b'library v1')
+    return path
+
+
+def read(content):
+    with open(content, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_second_export_is_a_cache_hit(stand_in, library):
+    assert export.export(str(library)) == 0
+    assert export.export(str(library)) == 0
+    assert len(stand_in.calls) == 1
+    assert read(library.with_suffix('.json')) == {'library': 'Test.library', 'call': 1}
+
+
+def test_force_bypasses_the_cache(stand_in, library):
+    assert export.export(str(library)) == 0
+    assert export.export(str(library), force=True) == 0
+    assert len(stand_in.calls) == 2
+    assert read(library.with_suffix('.json'))['call'] == 2
+
+
+def test_changed_library_host_or_exe_invalidates_the_cache(stand_in, library, monkeypatch):
+    assert export.export(str(library)) == 0
+    library.write_bytes(b'library v2')
+    assert export.export(str(library)) == 0
+    assert len(stand_in.calls) == 2
+
+    monkeypatch.setenv(core.LIBDOC_CODESYS, stand_in.exe + ' --Profile="Other"')
+    assert export.export(str(library)) == 0
+    assert len(stand_in.calls) == 3
+
+    monkeypatch.setenv(core.LIBDOC_CODESYS, stand_in.exe)
+    assert export.export(str(library)) == 0
+    assert len(stand_in.calls) == 3  # the first host again
+    stat = os.stat(stand_in.exe)
+    os.utime(stand_in.exe, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))  # a CODESYS update
+    assert export.export(str(library)) == 0
+    assert len(stand_in.calls) == 4
+
+
+def test_export_all_retries_a_library_in_use(stand_in, library, monkeypatch):
+    monkeypatch.setenv('STAND_IN_MODE', 'busy')
+    result, = export.export_all([str(library)], retries=3, backoff=0.01)
+    assert (result.code, result.attempts) == (0, 3)
+    assert read(result.content)['call'] == 3
+    assert all('libdoc-export-' in work for work in stand_in.calls)
+    assert not any(os.path.exists(work) for work in stand_in.calls)  # the work folders are removed
+
+
+def test_export_all_gives_up_after_the_retries(stand_in, library, monkeypatch):
+    monkeypatch.setenv('STAND_IN_MODE', 'busy')
+    result, = export.export_all([str(library)], retries=1, backoff=0.01)
+    assert (result.code, result.attempts) == (2, 2)
+    assert not os.path.exists(result.content)
+
+
+def test_export_all_kills_a_hanging_export(stand_in, library, monkeypatch):
+    monkeypatch.setenv('STAND_IN_MODE', 'sleep')
+    result, = export.export_all([str(library)], timeout=1)
+    assert result.code == 1
+    assert result.message.startswith('-- Timeout')
+    assert result.elapsed < 30
+    assert len(stand_in.calls) == 1
+    assert not os.path.exists(stand_in.calls[0])  # the work folder is removed
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+import pytest
+
+from libdoc import core, make
+from libdoc.content import Content
+
+LEGACY_AFTER_CLEAN = '''\
+import json
+import sys
+
+with open(sys.argv[0], 'r', encoding='utf-8') as f:
+    data = json.load(f)
+data['DataTypes']['ST_Data']['Doc'] = 'MODIFIED_BY_HOOK'
+with open(sys.argv[0], 'w', encoding='utf-8') as f:
+    json.dump(data, f)
+'''
+
+RUN_BEFORE_GENERATE = '''\
+import json
+import os
+import sys
+
+
+def run(context):
+    seen = {'data': type(context.data).__name__, 'content': type(context.content).__name__,
+            'frame': context.frame, 'cwd': os.getcwd(), 'argv': sys.argv}
+    with open(os.path.join(os.path.dirname(__file__), 'seen.json'), 'w', encoding='utf-8') as f:
+        json.dump(seen, f)
+'''
+
+RUN_QUIET = '''\
+def run(context):
+    return context.hook
+'''
+
+LEGACY_RESTLESS = '''\
+import os
+import sys
+
+sys.argv.append('changed')
+os.chdir(os.path.dirname(os.getcwd()))
+'''
+
+
+@pytest.fixture
+def run_make(content_file, monkeypatch):
+    """
+    Run ``libdoc make`` up to generate with the given hook scripts.
+    generate and transform are replaced, the generated data is returned.
+    """
+    def run(**scripts):
+        hooks = {}
+        for key, source in scripts.items():
+            path = content_file.parent / 'hooks' / '{0}.py'.format(key)
+            path.parent.mkdir(exist_ok=True)
+            path.write_text(source, encoding='utf-8')
+            hooks[key] = str(path)
+        generated = {}
+
+        def generate(content, frame=None, condensed=True, data=None):
+            generated['from_file'] = data is None
+            if data is None:
+                with open(content, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            generated['data'] = data
+            return frame
+
+        monkeypatch.setattr(core, 'get_configuration', lambda: {'Hooks': hooks})
+        monkeypatch.setattr(make, '_generate', generate)
+        monkeypatch.setattr(make, '_transform', lambda builder, frame, product=None: product)
+        assert make.make(str(content_file), 'Test.html', force=True) == 0
+        return generated
+    return run
+
+
+def test_legacy_hook_changes_are_generated(run_make):
+    generated = run_make(AfterClean=LEGACY_AFTER_CLEAN)
+    assert generated['from_file']
+    assert generated['data']['DataTypes']['ST_Data']['Doc'] == 'MODIFIED_BY_HOOK'
+
+
+def test_without_hooks_data_stays_in_memory(run_make):
+    generated = run_make()
+    assert not generated['from_file']
+    assert generated['data']['DataTypes']['ST_Data']['Doc'] == 'data'
+
+
+def test_run_hook_gets_the_loaded_content(run_make, content_file):
+    cwd, argv = os.getcwd(), list(sys.argv)
+    generated = run_make(BeforeGenerate=RUN_BEFORE_GENERATE)
+    with open(content_file.parent / 'hooks' / 'seen.json', 'r', encoding='utf-8') as f:
+        seen = json.load(f)
+    assert not generated['from_file']
+    assert seen['data'] == 'dict'
+    assert seen['content'] == Content.__name__
+    assert seen['frame'] == os.path.join(str(content_file.parent), core.FRAME)
+    assert seen['cwd'] == cwd and seen['argv'] == argv
+
+
+def test_hook_is_compiled_once(tmp_path):
+    path = tmp_path / 'hook.py'
+    path.write_text(RUN_BEFORE_GENERATE, encoding='utf-8')
+    hook = core.load_hook(str(path))
+    assert not hook.legacy
+    assert core.load_hook(str(path)) is hook
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert core.load_hook(str(path)) is not hook
+
+
+@pytest.mark.parametrize('source', [RUN_QUIET, LEGACY_RESTLESS])
+def test_hook_restores_cwd_and_argv(tmp_path, source):
+    path = tmp_path / 'hooks' / 'hook.py'
+    path.parent.mkdir()
+    path.write_text(source, encoding='utf-8')
+    cwd, argv = os.getcwd(), list(sys.argv)
+    core.load_hook(str(path))(core.HookContext('BeforeGenerate', ['a'], frame=str(tmp_path)))
+    assert os.getcwd() == cwd
+    assert sys.argv == argv
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from libdoc import serve
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    """
+    A daemon on a free port with a short idle timeout, served by a background thread.
+    """
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('USERPROFILE', str(tmp_path))
+    daemon = serve.Daemon(0, None, idle_timeout=0.5)
+    daemon.port = daemon.server_address[1]
+    daemon.token = serve._write_token(serve.token_file(daemon.port))
+
+    def loop():
+        while not daemon.stopped:
+            daemon.handle_request()
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    yield daemon
+    if not daemon.stopped:
+        serve.send(['shutdown'], port=daemon.port, timeout=5)
+    thread.join(5)
+    daemon.server_close()
+
+
+def test_round_trip(daemon, tmp_path):
+    assert serve.send(['ping'], port=daemon.port, timeout=5) == {'code': 0, 'output': 'pong\n', 'elapsed': 0.0}
+    answer = serve.send(['--version'], cwd=str(tmp_path), port=daemon.port, timeout=30)
+    assert answer['code'] == 0 and answer['output'].strip()
+    assert serve.send(['stats'], port=daemon.port, timeout=5)['code'] == 0
+    assert daemon.requests == 1
+
+
+def test_invalid_token(daemon):
+    with socket.create_connection((serve.HOST, daemon.port), 5) as connection:
+        connection.sendall(json.dumps({'argv': ['ping'], 'token': 'guess'}).encode('utf-8') + b'\n')
+        with connection.makefile('rb') as f:
+            assert json.loads(f.readline().decode('utf-8'))['output'] == 'Serve: invalid token\n'
+            assert f.readline() == b''  # closed
+
+
+def test_idle_client_does_not_block(daemon):
+    with socket.create_connection((serve.HOST, daemon.port), 5) as idle:
+        time.sleep(0.1)  # the daemon waits for the first request of the idle client
+        start = time.time()
+        assert serve.send(['ping'], port=daemon.port, timeout=5)['output'] == 'pong\n'
+        assert time.time() - start < 3
+        assert idle.recv(1) == b''  # the idle connection was closed
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+import os
+
+from libdoc.stage import tree_digest
+
+
+def test_tree_digest_of_rewritten_files(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    page = tmp_path / 'sub' / 'page.rst'
+    page.write_text('Title\n=====\n', encoding='utf-8')
+    by_stat, by_content = tree_digest(str(tmp_path)), tree_digest(str(tmp_path), content=True)
+
+    page.write_text('Title\n=====\n', encoding='utf-8')  # generate rewrites the same content
+    stat = os.stat(page)
+    os.utime(page, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert tree_digest(str(tmp_path)) != by_stat
+    assert tree_digest(str(tmp_path), content=True) == by_content
+
+    page.write_text('Other\n=====\n', encoding='utf-8')
+    assert tree_digest(str(tmp_path), content=True) != by_content
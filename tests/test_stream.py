@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+
+import pytest
+
+from libdoc.clean import JSONStream
+
+DOCUMENTS = [
+    '{"d": -0.5}',
+    '{"d": 1e5}',
+    '{"d": 12.25}',
+    '{"d": -12.5e-3, "e": 0}',
+    '{"d":123456789012345678}',
+    '{"d": [1, -2.5, 3E+2]}',
+    '{"d": {"e": 0.125}, "f": true, "g": null, "h": "-0."}',
+    '{ "d" : 7 , "e" : [ ] }',
+]
+
+
+def read(stream):
+    """
+    Read a document like the streaming clean does: the keys one by one, the values as a whole.
+    """
+    data = {}
+    for key in stream.keys():
+        data[key] = stream.value()
+    return data
+
+
+@pytest.mark.parametrize('chunk_size', range(1, 17))
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_chunks(document, chunk_size):
+    stream = JSONStream(io.StringIO(document), chunk_size=chunk_size)
+    assert read(stream) == json.loads(document)
+    assert stream.peek() == ''
+
+
+@pytest.mark.parametrize('chunk_size', range(1, 17))
+@pytest.mark.parametrize('document', ['-0.5', '1e5', '12.25', '0'])
+def test_number_at_the_end(document, chunk_size):
+    assert JSONStream(io.StringIO(document), chunk_size=chunk_size).value() == json.loads(document)
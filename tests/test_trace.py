@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import json
+import tracemalloc
+
+from libdoc import trace
+
+
+def test_spans_and_counters(tmp_path):
+    path = tmp_path / 'trace.json'
+    trace.start(str(path), memory=True, command=['make'])
+    with trace.span('outer'):
+        trace.count('files', 2)
+        with trace.span('inner'):
+            trace.count('files')
+    assert trace.stop() == str(path)
+    data = json.loads(path.read_text(encoding='utf-8'))
+    assert data['counters'] == {'files': 3}
+    assert [(span['name'], span['depth']) for span in data['spans']] == [('outer', 0), ('inner', 1)]
+    assert not tracemalloc.is_tracing()
+
+
+def test_keeps_a_running_tracemalloc(tmp_path):
+    tracemalloc.start()
+    try:
+        trace.start(str(tmp_path / 'trace.json'), memory=True)
+        with trace.span('work'):
+            pass
+        trace.stop()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()